@@ -0,0 +1,126 @@
+"""Local stand-in for erp.jnvuiums.in's Exam_ForALL_AdmitCard.aspx.
+
+Serves the WebForms page (#txtchallanNo, #btnGetResult, __VIEWSTATE /
+__EVENTVALIDATION), answers the postback with a synthetic admit-card PDF as
+an attachment, and hands out cookieless ``(S(...))`` session URLs the way
+ASP.NET does. Latency, error, stall and not-found rates are configurable.
+
+    python -m bench.mock_portal --port 8765 --latency 0.3 --jitter 0.2 --error-rate 0.02 --stall-rate 0.05
+"""
+import argparse
+import asyncio
+import os
+import random
+import secrets
+from urllib.parse import parse_qs
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
+
+from bench.synthetic_pdf import make_admit_card_pdf
+
+PAGE_PATH = "/Exam/Pre_Exam/Exam_ForALL_AdmitCard.aspx"
+VIEWSTATE = "dDwtMTI3OTMzNDM4NDs7PrK1t2i8m5k4"
+EVENTVALIDATION = "wEWAwKO7b6bBgLs0fbZDAKM54rGBg"
+
+class PortalConfig:
+    latency = float(os.getenv("MOCK_LATENCY", 0.2))
+    jitter = float(os.getenv("MOCK_JITTER", 0.1))
+    error_rate = float(os.getenv("MOCK_ERROR_RATE", 0.0))
+    not_found_rate = float(os.getenv("MOCK_NOT_FOUND_RATE", 0.1))
+    stall_rate = float(os.getenv("MOCK_STALL_RATE", 0.0))  # postbacks that hang for stall_seconds
+    stall_seconds = float(os.getenv("MOCK_STALL_SECONDS", 10))
+    asset_latency = float(os.getenv("MOCK_ASSET_LATENCY", 0.3))
+
+config = PortalConfig()
+app = FastAPI()
+stats = {"page": 0, "postback": 0, "pdf": 0, "not_found": 0, "error": 0, "stall": 0, "assets": 0}
+
+def page_html(session, message=""):
+    return f"""<!DOCTYPE html>
+<html><head><title>JNVU Admit Card</title>
+<link rel="stylesheet" href="/assets/site.css"><link rel="stylesheet" href="/assets/fonts.css">
+<script src="/assets/analytics.js"></script></head>
+<body><img src="/assets/banner.jpg" alt="JNVU">
+<form method="post" action="./Exam_ForALL_AdmitCard.aspx#" id="form1">
+<input type="hidden" name="__EVENTTARGET" id="__EVENTTARGET" value="" />
+<input type="hidden" name="__EVENTARGUMENT" id="__EVENTARGUMENT" value="" />
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{VIEWSTATE}" />
+<input type="hidden" name="__VIEWSTATEGENERATOR" id="__VIEWSTATEGENERATOR" value="C2EE9ABB" />
+<input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="{EVENTVALIDATION}" />
+<span id="lblMsg">{message}</span>
+<input name="txtchallanNo" type="text" id="txtchallanNo" />
+<input type="submit" name="btnGetResult" value="Get Admit Card" id="btnGetResult" />
+</form><img src="/assets/footer.png"></body></html>"""
+
+async def upstream_delay(scale=1.0):
+    await asyncio.sleep(max(0.0, (config.latency + random.uniform(-config.jitter, config.jitter)) * scale))
+
+@app.get(PAGE_PATH)
+async def new_session():
+    # ASP.NET cookieless sessions: the bare URL redirects into a fresh (S(...)) segment
+    return RedirectResponse(f"/(S({secrets.token_hex(12)})){PAGE_PATH}", status_code=302)
+
+@app.get("/{session}" + PAGE_PATH)
+async def admit_card_page(session: str):
+    stats["page"] += 1
+    await upstream_delay(0.5)
+    return HTMLResponse(page_html(session))
+
+@app.post("/{session}" + PAGE_PATH)
+async def admit_card_postback(session: str, request: Request):
+    form = {k: v[0] for k, v in parse_qs((await request.body()).decode(), keep_blank_values=True).items()}
+    stats["postback"] += 1
+    await upstream_delay()
+    if random.random() < config.stall_rate:
+        stats["stall"] += 1
+        await asyncio.sleep(config.stall_seconds)
+    if random.random() < config.error_rate:
+        stats["error"] += 1
+        return Response("Server Error in '/' Application.", status_code=500)
+    if form.get("__VIEWSTATE") != VIEWSTATE or form.get("__EVENTVALIDATION") != EVENTVALIDATION:
+        stats["error"] += 1
+        return Response("Invalid postback or callback argument.", status_code=500)
+    form_number = form.get("txtchallanNo", "").strip()
+    if not form_number.isdigit() or random.Random(int(form_number)).random() < config.not_found_rate:
+        stats["not_found"] += 1
+        return HTMLResponse(page_html(session, "Record Not Found"))
+    stats["pdf"] += 1
+    return Response(
+        make_admit_card_pdf(form_number), media_type="application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="AdmitCard_{form_number}.pdf"'},
+    )
+
+@app.get("/assets/{name}")
+async def asset(name: str):
+    # Images, stylesheets, fonts and analytics the real page drags in; slow on purpose
+    stats["assets"] += 1
+    await asyncio.sleep(config.asset_latency)
+    ctype = {"css": "text/css", "js": "application/javascript", "png": "image/png", "jpg": "image/jpeg"}
+    return Response(b"/* asset */" + b" " * 50_000, media_type=ctype.get(name.rsplit(".", 1)[-1], "application/octet-stream"))
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=config.latency)
+    parser.add_argument("--jitter", type=float, default=config.jitter)
+    parser.add_argument("--error-rate", type=float, default=config.error_rate)
+    parser.add_argument("--not-found-rate", type=float, default=config.not_found_rate)
+    parser.add_argument("--stall-rate", type=float, default=config.stall_rate)
+    parser.add_argument("--stall-seconds", type=float, default=config.stall_seconds)
+    parser.add_argument("--asset-latency", type=float, default=config.asset_latency)
+    args = parser.parse_args()
+    config.latency, config.jitter = args.latency, args.jitter
+    config.error_rate, config.not_found_rate = args.error_rate, args.not_found_rate
+    config.stall_rate, config.stall_seconds = args.stall_rate, args.stall_seconds
+    config.asset_latency = args.asset_latency
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
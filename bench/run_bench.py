@@ -0,0 +1,240 @@
+"""Offline load/benchmark harness for the admit-card pipeline.
+
+Starts bench.mock_portal on a local port, points main.py at it and drives
+download_jnvu_pdf, extract_student_info and the full fetch pipeline at the
+given concurrency levels. Reports p50/p95/p99 latency, requests/second and
+peak RSS of this process tree (Chromium and the parse pool included).
+
+    python -m bench.run_bench --engine http --concurrency 1 8 32 --requests 200
+    python -m bench.run_bench --scenario extract --requests 500
+    python -m bench.run_bench --json bench_output.json --max-p95 2.0
+
+Exits non-zero when --max-p95 / --min-rps are given and not met.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from bench.synthetic_pdf import make_admit_card_pdf
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_portal(args):
+    port = free_port()
+    cmd = [
+        sys.executable, "-m", "bench.mock_portal", "--port", str(port),
+        "--latency", str(args.latency), "--jitter", str(args.jitter),
+        "--error-rate", str(args.error_rate), "--not-found-rate", str(args.not_found_rate),
+        "--stall-rate", str(args.stall_rate),
+    ]
+    proc = subprocess.Popen(cmd)
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"{base}/stats", timeout=1)
+            return proc, base
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("mock portal did not start")
+
+def tree_rss_kb(root_pid, exclude=()):
+    # Sum VmRSS over root_pid and all its descendants (Chromium, parse workers)
+    parents = {}
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                parents[int(pid)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    tree, frontier = {root_pid}, [root_pid]
+    while frontier:
+        parent = frontier.pop()
+        for pid, ppid in parents.items():
+            if ppid == parent and pid not in tree and pid not in exclude:
+                tree.add(pid)
+                frontier.append(pid)
+    total = 0
+    for pid in tree:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            continue
+    return total
+
+class RssSampler:
+    def __init__(self, exclude=()):
+        self.exclude = set(exclude)
+        self.peak_kb = 0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            self.peak_kb = max(self.peak_kb, tree_rss_kb(os.getpid(), self.exclude))
+            await asyncio.sleep(0.2)
+
+    def __enter__(self):
+        self.peak_kb = 0
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+        self.peak_kb = max(self.peak_kb, tree_rss_kb(os.getpid(), self.exclude))
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def summarize(name, concurrency, latencies, outcomes, wall, peak_kb):
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "outcomes": outcomes,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "rps": len(latencies) / wall if wall else 0.0,
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+    }
+
+async def drive(fn, form_numbers, concurrency, exclude):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, outcomes = [], {}
+
+    async def one(form_number):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                outcome = await fn(form_number)
+            except Exception as e:
+                outcome = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    with RssSampler(exclude) as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(n) for n in form_numbers))
+        wall = time.perf_counter() - started
+    return latencies, outcomes, wall, rss.peak_kb
+
+async def run(args, exclude):
+    import main  # imported here so it picks up the JNVU_URL / engine settings
+
+    async def download(form_number):
+        pdf = await main.download_jnvu_pdf(form_number)
+        return "pdf" if pdf is not None else "not_found"
+
+    async def pipeline(form_number):
+        # Through the scheduler like a real lookup, one "chat" per form number
+        entry = await main.lookup_admit_card(form_number, f"bench:{form_number}")
+        return "found" if entry is not None else "not_found"
+
+    # Same warm-up the app does at startup, so the first pipeline requests do not time process spawns
+    await main.warm_extract_pool()
+    results = []
+    start = 100000
+    for concurrency in args.concurrency:
+        if args.scenario in ("download", "all"):
+            numbers = [str(start + i) for i in range(args.requests)]
+            start += args.requests
+            results.append(summarize("download", concurrency, *await drive(download, numbers, concurrency, exclude)))
+            results[-1]["aimd_limit"] = round(main.upstream_limiter.limit, 1)
+        if args.scenario in ("pipeline", "all"):
+            numbers = [str(start + i) for i in range(args.requests)]
+            start += args.requests
+            results.append(summarize("pipeline", concurrency, *await drive(pipeline, numbers, concurrency, exclude)))
+            results[-1]["aimd_limit"] = round(main.upstream_limiter.limit, 1)
+
+    if args.scenario in ("extract", "all"):
+        pdfs = [make_admit_card_pdf(str(start + i)) for i in range(args.requests)]
+        latencies, misses = [], 0
+        with RssSampler(exclude) as rss:
+            started = time.perf_counter()
+            for pdf in pdfs:
+                t = time.perf_counter()
+                info = main.extract_student_info(pdf)
+                latencies.append(time.perf_counter() - t)
+                misses += "Not Found" in info.values()
+            wall = time.perf_counter() - started
+        results.append(summarize("extract", 1, latencies, {"parse_miss": misses}, wall, rss.peak_kb))
+
+        with RssSampler(exclude) as rss:
+            started = time.perf_counter()
+            infos = await main.extract_many(pdfs)
+            wall = time.perf_counter() - started
+        misses = sum("Not Found" in info.values() for info in infos)
+        results.append(summarize("extract_many", main.EXTRACT_WORKERS, [wall / len(pdfs)] * len(pdfs),
+                                 {"parse_miss": misses}, wall, rss.peak_kb))
+    return results
+
+def print_table(results):
+    print(f"{'scenario':<14}{'conc':>6}{'reqs':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>9}{'rss MB':>9}"
+          f"{'limit':>7}  outcomes")
+    for r in results:
+        ms = lambda v: f"{v * 1000:.1f}" if v is not None else "-"
+        print(f"{r['scenario']:<14}{r['concurrency']:>6}{r['requests']:>7}{ms(r['p50']):>10}{ms(r['p95']):>10}"
+              f"{ms(r['p99']):>10}{r['rps']:>9.1f}{r['peak_rss_mb']:>9}{r.get('aimd_limit', '-'):>7}  {r['outcomes']}")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=["download", "pipeline", "extract", "all"], default="all")
+    parser.add_argument("--engine", choices=["http", "browser"], default="http")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--portal-url", help="use an already running portal instead of starting bench.mock_portal")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--not-found-rate", type=float, default=0.1)
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="share of postbacks the portal sits on for 10s")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--max-p95", type=float, help="fail if any scenario's p95 (seconds) is above this")
+    parser.add_argument("--min-rps", type=float, help="fail if any scenario's throughput is below this")
+    args = parser.parse_args()
+
+    portal, base = (None, args.portal_url.rstrip("/")) if args.portal_url else start_portal(args)
+    os.environ["JNVU_URL"] = f"{base}/Exam/Pre_Exam/Exam_ForALL_AdmitCard.aspx"
+    os.environ["HTTP_ENGINE"] = "1" if args.engine == "http" else "0"
+    os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="jnvu-bench-"))
+    os.environ.setdefault("TRACE_LOG", "0")
+    os.environ.setdefault("POOL_SIZE", str(max(args.concurrency)))
+    try:
+        results = asyncio.run(run(args, exclude=[portal.pid] if portal else []))
+    finally:
+        if portal is not None:
+            portal.terminate()
+            portal.wait()
+
+    self_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print_table(results)
+    print(f"peak RSS of the harness process: {self_peak / 1024:.1f} MB")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"engine": args.engine, "results": results}, f, indent=2)
+
+    failed = [r for r in results if (args.max_p95 and r["p95"] and r["p95"] > args.max_p95)
+              or (args.min_rps and r["rps"] < args.min_rps)]
+    for r in failed:
+        print(f"FAIL: {r['scenario']} @ {r['concurrency']}: p95={r['p95']:.3f}s rps={r['rps']:.1f}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main_cli()
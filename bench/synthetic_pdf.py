@@ -0,0 +1,50 @@
+"""Synthetic JNVU admit cards with the same text layout the parser expects."""
+import random
+
+import fitz  # PyMuPDF
+
+FIRST = ["RAM", "SITA", "MOHAN", "PRIYA", "ARJUN", "KAVITA", "VIKRAM", "POOJA", "RAHUL", "NEHA"]
+LAST = ["SHARMA", "CHOUDHARY", "SINGH", "MEENA", "JAT", "BISHNOI", "GEHLOT", "SOLANKI"]
+CENTRES = [
+    "GOVT. LACHOO MEMORIAL COLLEGE OF SCIENCE AND TECHNOLOGY, JODHPUR",
+    "KAMLA NEHRU COLLEGE FOR WOMEN, JODHPUR",
+    "MAHILA P.G. MAHAVIDYALAYA, JODHPUR",
+]
+
+def fields_for(form_number):
+    rng = random.Random(int(form_number))
+    return {
+        "roll": f"{rng.randint(100000, 999999)}",
+        "name": f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+        "father": f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+        "college": rng.choice(CENTRES),
+        "center": rng.choice(CENTRES),
+    }
+
+def make_admit_card_pdf(form_number, pages=2):
+    info = fields_for(form_number)
+    doc = fitz.open()
+    page = doc.new_page()
+    lines = [
+        "JAI NARAIN VYAS UNIVERSITY, JODHPUR",
+        "NAME OF EXAMINATION : B.A. PART I (MAIN) EXAMINATION",
+        f"Roll no is {info['roll']}",
+        f"NAME OF CANDIDATE : {info['name']}",
+        f"FATHER'S NAME : {info['father']}",
+        f"COLLEGE NAME : {info['college']}",
+        f"FORM NO : {form_number}",
+        "Your Exam Centre is",
+        *info["center"].replace(", ", ",\n").split("\n"),
+        "Print Date : 01/03/2026",
+        "To,",
+        "The Centre Superintendent",
+    ]
+    y = 72
+    for line in lines:
+        page.insert_text((50, y), line, fontsize=10)
+        y += 18
+    for _ in range(pages - 1):
+        doc.new_page().insert_text((50, 72), "INSTRUCTIONS TO THE CANDIDATE", fontsize=10)
+    data = doc.tobytes(deflate=True)
+    doc.close()
+    return data
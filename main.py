@@ -1,530 +1,2627 @@
 import asyncio
+import bisect
+import contextlib
+import contextvars
+import csv
+import hashlib
+import io
+import json
+import math
+import multiprocessing
 import os
 import re
-import threading
-import fitz  # PyMuPDF
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+import httpx
 import uvicorn
-import nest_asyncio
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel
 from telegram import Update
+from telegram.error import RetryAfter
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters, ContextTypes
-from playwright.async_api import async_playwright
-
-# लूप की समस्या सुलझाने के लिए
-nest_asyncio.apply()
 
 # --- 1. FastAPI Setup ---
-app = FastAPI()
+# uvicorn owns the one event loop; the bot starts and stops with the app
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    await start_bot()
+    yield
+    await stop_bot()
+
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/")
 async def home():
+    # Liveness only: the process is up. Whether it can take traffic yet is /ready
     return {"status": "Bot is Running"}
 
-def run_fastapi():
-    # Render या लोकल के लिए पोर्ट सेटअप
-    port = int(os.environ.get("PORT", 10000))
-    uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
+@app.get("/ready")
+async def ready():
+    state = startup.snapshot()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+# --- 2. Metrics & Tracing ---
+TRACE_LOG = os.getenv("TRACE_LOG", "1") == "1"
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+METRICS = []
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    # Prometheus text format: backslash, double quote and newline are escaped in label values
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join('%s="%s"' % (k, escape(v)) for k, v in labels) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}
+        METRICS.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield self.name, key, value
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def __init__(self, name, help, fn=None, labelled=False):
+        super().__init__(name, help)
+        self.fn = fn
+        if not labelled:
+            self.values[()] = 0  # report 0 before the first set(); a labelled gauge has no such sample
+
+    def set(self, value, **labels):
+        self.values[tuple(sorted(labels.items()))] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.fn is not None:
+            yield self.name, (), self.fn()
+        else:
+            yield from super().samples()
+
+class Histogram(Counter):
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        counts, total, n = self.values.get(key, ([0] * len(self.buckets), 0.0, 0))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        self.values[key] = (counts, total + value, n + 1)
+
+    def samples(self):
+        for key, (counts, total, n) in self.values.items():
+            for bound, count in zip(self.buckets, counts):
+                yield f"{self.name}_bucket", key + (("le", bound),), count
+            yield f"{self.name}_bucket", key + (("le", "+Inf"),), n
+            yield f"{self.name}_sum", key, total
+            yield f"{self.name}_count", key, n
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+STAGE_SECONDS = Histogram("jnvu_stage_seconds", "Time spent in each lookup stage")
+LOOKUPS = Counter("jnvu_lookups_total", "Admit-card lookups by outcome (cache_hit, success, not_found, timeout, error)")
+PARSE_MISSES = Counter("jnvu_parse_misses_total", "Fields extract_student_info could not find")
+PARSE_CONFIDENCE = Histogram("jnvu_parse_confidence", "Confidence of each extracted field", buckets=(0, 0.4, 0.7, 1))
+BROWSER_CONTEXTS = Gauge("jnvu_browser_contexts_open", "Playwright browser contexts currently open")
+JOBS_IN_FLIGHT = Gauge("jnvu_jobs_in_flight", "Download jobs currently running", fn=lambda: scheduler.active)
+JOBS_QUEUED = Gauge("jnvu_jobs_queued", "Download jobs waiting in the scheduler", fn=lambda: scheduler.depth)
+
+class Trace:
+    def __init__(self, source, form_number):
+        self.source = source
+        self.form_number = form_number
+        self.stages = {}
+        self.outcome = None  # set by count_lookup when this request did the upstream fetch
+        self.parse_misses = []
+        self.started = time.perf_counter()
+
+    def finish(self, outcome):
+        total = time.perf_counter() - self.started
+        STAGE_SECONDS.observe(total, stage="total")
+        if TRACE_LOG:
+            print(json.dumps({
+                "event": "lookup", "source": self.source, "form_number": self.form_number,
+                "outcome": self.outcome or outcome, "total": round(total, 3),
+                "stages": {k: round(v, 3) for k, v in self.stages.items()},
+                **({"parse_misses": self.parse_misses} if self.parse_misses else {}),
+            }))
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+def start_trace(source, form_number):
+    trace = Trace(source, form_number)
+    current_trace.set(trace)
+    return trace
 
-# --- 2. Global Browser State ---
-browser_instance = None
-playwright_instance = None
+def count_lookup(outcome):
+    LOOKUPS.inc(outcome=outcome)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.outcome = outcome
+
+def record_parse(entry):
+    # Fields that came out missing or shaky, for the metrics and the lookup's trace line
+    confidence = entry.info.get("confidence", {})
+    misses = []
+    for field, value in entry.info.items():
+        if field == "confidence":
+            continue
+        if field in confidence:
+            PARSE_CONFIDENCE.observe(confidence[field], field=field)
+        if value == "Not Found":
+            PARSE_MISSES.inc(field=field)
+            misses.append(field)
+    trace = current_trace.get()
+    if trace is not None and misses:
+        trace.parse_misses = misses
+
+def record_stage(stage, elapsed):
+    STAGE_SECONDS.observe(elapsed, stage=stage)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.stages[stage] = trace.stages.get(stage, 0) + elapsed
+
+@contextlib.contextmanager
+def timed(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# --- 3. Browser Supervisor ---
+BROWSER_MAX_CONTEXTS = int(os.getenv("BROWSER_MAX_CONTEXTS", 500))  # recycle after this many contexts
+BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", 1500))  # ... or above this much Chromium RSS
+BROWSER_CHECK_INTERVAL = float(os.getenv("BROWSER_CHECK_INTERVAL", 30))
+BROWSER_DRAIN_TIMEOUT = float(os.getenv("BROWSER_DRAIN_TIMEOUT", 120))
+
+BROWSER_LAUNCHES = Counter("jnvu_browser_launches_total", "Chromium launches by reason")
+
+def chromium_rss_kb():
+    # VmRSS of every Chromium process below this one (the Playwright driver launches them)
+    children, names = {}, {}
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                name, rest = f.read().split(" (", 1)[1].rsplit(") ", 1)
+            children.setdefault(int(rest.split()[1]), []).append(int(pid))
+            names[int(pid)] = name
+        except (OSError, IndexError, ValueError):
+            continue
+    total, stack = 0, list(children.get(os.getpid(), []))
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        if "chrom" in names.get(pid, "") or "headless_shell" in names.get(pid, ""):
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    total += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+            except (OSError, StopIteration):
+                pass
+    return total
+
+class BrowserSupervisor:
+    """Owns the Chromium instance for the whole process.
+
+    Launch is serialised by a lock, a crashed browser is relaunched on next use,
+    and after ``max_contexts`` contexts or ``max_rss_mb`` of Chromium RSS a fresh
+    browser takes new contexts while the old one drains and is closed.
+    """
+
+    def __init__(self, max_contexts=BROWSER_MAX_CONTEXTS, max_rss_mb=BROWSER_MAX_RSS_MB):
+        self.max_contexts = max_contexts
+        self.max_rss_mb = max_rss_mb
+        self.playwright = None
+        self.browser = None
+        self.generation = 0
+        self.contexts_created = 0
+        self.rss_kb = 0
+        self.recycle_reason = None
+        self._lock = asyncio.Lock()
+        self._open = {}  # context -> browser it belongs to
+        self._retired = {}  # old browser -> time it was retired
+        self._monitor = None
+
+    def healthy(self):
+        return self.browser is not None and self.browser.is_connected() and self.recycle_reason is None
+
+    async def get_browser(self):
+        if self.healthy():
+            return self.browser
+        async with self._lock:
+            if self.healthy():
+                return self.browser
+            if self.playwright is None:
+                from playwright.async_api import async_playwright  # ~0.2s of imports, paid only if a browser is used
+                self.playwright = await async_playwright().start()
+            reason = self.recycle_reason or ("crash" if self.browser is not None else "start")
+            old = self.browser
+            self.browser = await self.playwright.chromium.launch(
+                headless=True,
+                args=["--no-sandbox", "--disable-setuid-sandbox", "--disable-dev-shm-usage"]
+            )
+            self.browser.on("disconnected", self._on_disconnected)
+            self.generation += 1
+            self.contexts_created = 0
+            self.recycle_reason = None
+            BROWSER_LAUNCHES.inc(reason=reason)
+            if old is not None and old.is_connected():
+                self._retired[old] = asyncio.get_running_loop().time()
+                await self._close_if_drained(old)
+            if self._monitor is None:
+                self._monitor = asyncio.create_task(self._watch())
+            return self.browser
+
+    def _on_disconnected(self, browser):
+        self._retired.pop(browser, None)
+        for context in [c for c, b in self._open.items() if b is browser]:
+            del self._open[context]
+            BROWSER_CONTEXTS.dec()
+        if browser is self.browser:
+            print("Browser disconnected, relaunching on next use")
+
+    def is_current(self, context):
+        return self._open.get(context) is self.browser and self.healthy()
+
+    async def new_context(self, **kwargs):
+        browser = await self.get_browser()
+        context = await browser.new_context(**kwargs)
+        self._open[context] = browser
+        self.contexts_created += 1
+        BROWSER_CONTEXTS.inc()
+        if self.contexts_created >= self.max_contexts:
+            self.recycle_reason = "max_contexts"
+        return context
+
+    async def close_context(self, context):
+        browser = self._open.pop(context, None)
+        if browser is not None:
+            BROWSER_CONTEXTS.dec()
+        try:
+            await context.close()
+        except Exception:
+            pass
+        if browser in self._retired:
+            await self._close_if_drained(browser)
+
+    async def _close_if_drained(self, browser, force=False):
+        if force or not any(b is browser for b in self._open.values()):
+            self._retired.pop(browser, None)
+            try:
+                await browser.close()
+            except Exception:
+                pass
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(BROWSER_CHECK_INTERVAL)
+            try:
+                now = asyncio.get_running_loop().time()
+                for browser, retired_at in list(self._retired.items()):
+                    if now - retired_at > BROWSER_DRAIN_TIMEOUT:
+                        await self._close_if_drained(browser, force=True)
+                self.rss_kb = await asyncio.to_thread(chromium_rss_kb)
+                # The sum includes browsers still draining; judging it then would recycle the fresh one too
+                if self.rss_kb > self.max_rss_mb * 1024 and self.recycle_reason is None and not self._retired:
+                    print(f"Browser RSS {self.rss_kb // 1024} MB over {self.max_rss_mb} MB, recycling")
+                    self.recycle_reason = "max_rss"
+            except Exception as e:
+                print(f"Browser Monitor Error: {e}")
+
+    async def close(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+        for browser in [*self._retired, self.browser]:
+            if browser is not None:
+                try:
+                    await browser.close()
+                except Exception:
+                    pass
+        if self.playwright is not None:
+            await self.playwright.stop()
+
+browser_supervisor = BrowserSupervisor()
+BROWSER_RSS = Gauge("jnvu_browser_rss_bytes", "Resident memory of the Chromium processes", fn=lambda: browser_supervisor.rss_kb * 1024)
 
 async def get_browser():
-    global browser_instance, playwright_instance
-    if browser_instance is None:
-        playwright_instance = await async_playwright().start()
-        browser_instance = await playwright_instance.chromium.launch(
-            headless=True,
-            args=["--no-sandbox", "--disable-setuid-sandbox", "--disable-dev-shm-usage"]
-        )
-    return browser_instance
+    return await browser_supervisor.get_browser()
+
+# --- 4. Cookieless Sessions ---
+# The portal keeps ASP.NET session state in the URL: the bare page redirects to
+# /(S(<id>))/Exam/... and the id expires after SESSION_TIMEOUT seconds without a request.
+JNVU_URL = os.getenv("JNVU_URL", "https://erp.jnvuiums.in/Exam/Pre_Exam/Exam_ForALL_AdmitCard.aspx")
+SESSION_POOL_SIZE = int(os.getenv("SESSION_POOL_SIZE", 4))
+SESSION_TIMEOUT = float(os.getenv("SESSION_TIMEOUT", 1200))  # ASP.NET default is 20 minutes
+SESSION_REFRESH_MARGIN = float(os.getenv("SESSION_REFRESH_MARGIN", 300))
+SESSION_MAX_AGE = float(os.getenv("SESSION_MAX_AGE", 3600))
+SESSION_CHECK_INTERVAL = float(os.getenv("SESSION_CHECK_INTERVAL", 60))
+
+SESSION_RE = re.compile(r"/\(S\([A-Za-z0-9]+\)\)/")
+SESSIONS_STARTED = Counter("jnvu_sessions_started_total", "Cookieless portal sessions discovered, by reason")
+
+class PortalSession:
+    def __init__(self, url):
+        self.url = url
+        self.created = self.last_used = time.monotonic()
+        self.form = None  # parsed form for this session, see AspNetClient
+
+    def adopt(self, url):
+        # The portal answered on another session id (ours expired server-side); keep using that one
+        url = url.split("#")[0]
+        if url != self.url:
+            self.url = url
+            self.created = time.monotonic()
+            self.form = None
+        self.last_used = time.monotonic()
+
+    def stale(self):
+        now = time.monotonic()
+        return (now - self.last_used > SESSION_TIMEOUT - SESSION_REFRESH_MARGIN
+                or now - self.created > SESSION_MAX_AGE)
+
+class SessionManager:
+    """Hands out live (S(...)) session URLs so lookups skip the redirect.
+
+    ASP.NET runs one request at a time per session, so a session is lent to one
+    lookup at a time. The pool starts with ``size`` sessions and grows with the
+    AIMD limit on upstream downloads (shrinking again as sessions expire), so it
+    is never the cap on concurrency. Sessions close to expiring are replaced in
+    the background.
+    """
+
+    def __init__(self, entry_url=JNVU_URL, size=SESSION_POOL_SIZE):
+        self.entry_url = entry_url.split("#")[0]
+        self.size = size
+        self._client = None
+        self._idle = deque()
+        self._available = None
+        self._tasks = set()
+        self._started = False
+        self.total = 0  # idle, lent out or being discovered
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def target(self):
+        # One more than the limit leaves room for a hedged attempt
+        return max(self.size, math.ceil(upstream_limiter.limit) + 1)
+
+    def _retire(self, reason):
+        # A session that went away is replaced unless the pool is bigger than it needs to be
+        if self.total > self.target():
+            self.total -= 1
+        else:
+            self._spawn(self._add(reason))
+
+    async def discover(self, reason="new"):
+        if self._client is None:
+            self._client = httpx.AsyncClient(follow_redirects=False, timeout=httpx.Timeout(30, connect=10))
+        with timed("session"):
+            resp = await self._client.get(self.entry_url)
+        location = resp.headers.get("location", "")
+        SESSIONS_STARTED.inc(reason=reason)
+        if resp.is_redirect and SESSION_RE.search(location):
+            return PortalSession(urljoin(self.entry_url, location).split("#")[0])
+        resp.raise_for_status()
+        # No redirect: the portal is not using cookieless sessions (any more), the bare URL works
+        return PortalSession(self.entry_url)
+
+    async def wait_ready(self):
+        self.start()
+        async with self._available:
+            await self._available.wait_for(lambda: self._idle)
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        self._available = asyncio.Condition()
+        self.total = self.size
+        for _ in range(self.size):
+            self._spawn(self._add("new"))
+        self._spawn(self._refresh_loop())
+
+    async def _add(self, reason):
+        delay = 1
+        while True:
+            try:
+                session = await self.discover(reason)
+                break
+            except Exception as e:
+                print(f"Session Error: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+        async with self._available:
+            self._idle.append(session)
+            self._available.notify()
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(SESSION_CHECK_INTERVAL)
+            for session in [s for s in self._idle if s.stale()]:
+                self._idle.remove(session)
+                self._retire("refresh")
+
+    async def acquire(self):
+        self.start()
+        async with self._available:
+            while True:
+                if not self._idle and self.total < self.target():
+                    self.total += 1
+                    self._spawn(self._add("grow"))
+                await self._available.wait_for(lambda: self._idle)
+                session = self._idle.popleft()
+                if not session.stale():
+                    return session
+                self._retire("expired")
+
+    async def release(self, session, ok=True):
+        if not ok:
+            self._retire("failed")
+            return
+        session.last_used = time.monotonic()
+        async with self._available:
+            self._idle.append(session)
+            self._available.notify()
+
+    @contextlib.asynccontextmanager
+    async def session(self):
+        session = await self.acquire()
+        ok = False
+        try:
+            yield session
+            ok = True
+        finally:
+            await self.release(session, ok)
+
+sessions = SessionManager()
+SESSIONS_IDLE = Gauge("jnvu_sessions_idle", "Live portal sessions waiting for a lookup", fn=lambda: len(sessions._idle))
+
+# --- 5. Warm Page Pool ---
+POOL_SIZE = int(os.getenv("POOL_SIZE", 3))
+POOL_MAX_USES = int(os.getenv("POOL_MAX_USES", 50))
+POOL_MAX_IDLE = float(os.getenv("POOL_MAX_IDLE", 600))  # seconds before an idle form is reloaded
+POOL_ACQUIRE_TIMEOUT = float(os.getenv("POOL_ACQUIRE_TIMEOUT", 60))
+BROWSER_DOWNLOAD_GRACE = float(os.getenv("BROWSER_DOWNLOAD_GRACE", 5))  # wait for a download after the form reloads
+
+# Only the form DOM and the download matter; everything else on the ERP page is dead weight.
+# BLOCK_RESOURCES=0 turns this off, e.g. to measure what it saves with bench.run_bench.
+BLOCK_RESOURCES = os.getenv("BLOCK_RESOURCES", "1") == "1"
+BLOCKED_RESOURCE_TYPES = set(os.getenv("BLOCKED_RESOURCE_TYPES", "image,media,font,stylesheet").split(","))
+BLOCKED_URL_PATTERNS = [
+    re.compile(p) for p in os.getenv(
+        "BLOCKED_URL_PATTERNS", r"google-analytics\.com,googletagmanager\.com,doubleclick\.net,facebook\.net,/analytics\.js,adservice"
+    ).split(",") if p
+]
+PAGE_WAIT_UNTIL = os.getenv("PAGE_WAIT_UNTIL", "domcontentloaded")
+
+BLOCKED_REQUESTS = Counter("jnvu_blocked_requests_total", "Browser requests aborted by the routing layer")
+PAGE_BYTES = Counter("jnvu_page_bytes_total", "Bytes received by pooled pages (Content-Length), by resource type")
+
+async def route_request(route):
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or any(p.search(request.url) for p in BLOCKED_URL_PATTERNS):
+        BLOCKED_REQUESTS.inc(type=request.resource_type)
+        await route.abort()
+    else:
+        await route.continue_()
+
+def count_response_bytes(response):
+    PAGE_BYTES.inc(int(response.headers.get("content-length") or 0), type=response.request.resource_type)
+
+class PooledPage:
+    def __init__(self, context, page):
+        self.context = context
+        self.page = page
+        self.session = None  # each page keeps its own portal session, see _load
+        self.uses = 0
+        self.loaded_at = 0.0
+
+class PagePool:
+    """Browser contexts with the admit-card form already loaded.
+
+    acquire() hands out a ready page; release() reloads it (or replaces it once
+    it has served ``max_uses`` lookups) in the background and puts it back.
+    """
+
+    def __init__(self, size=POOL_SIZE, max_uses=POOL_MAX_USES, max_idle=POOL_MAX_IDLE):
+        self.size = size
+        self.max_uses = max_uses
+        self.max_idle = max_idle
+        self._ready = None
+        self._tasks = set()
+        self._started = False
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def wait_ready(self):
+        # Chromium is up and at least one page has the form loaded
+        self.start()
+        while self._ready.empty():
+            await asyncio.sleep(0.1)
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        self._ready = asyncio.Queue()
+        for _ in range(self.size):
+            self._spawn(self._refill())
+
+    async def _load(self, slot):
+        if slot.session is None or slot.session.stale():
+            slot.session = await sessions.discover("page")
+        with timed("page_load"):
+            await slot.page.goto(slot.session.url, wait_until=PAGE_WAIT_UNTIL, timeout=60000)
+            await slot.page.wait_for_selector("#txtchallanNo", timeout=10000)
+        slot.session.adopt(slot.page.url)
+        slot.loaded_at = asyncio.get_running_loop().time()
+
+    async def _refill(self):
+        delay = 1
+        while True:
+            context = None
+            try:
+                context = await browser_supervisor.new_context(accept_downloads=True)
+                if BLOCK_RESOURCES:
+                    await context.route("**/*", route_request)
+                slot = PooledPage(context, await context.new_page())
+                slot.page.on("response", count_response_bytes)
+                await self._load(slot)
+                self._ready.put_nowait(slot)
+                return
+            except Exception as e:
+                print(f"Pool Error: {e}")
+                if context is not None:
+                    await browser_supervisor.close_context(context)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    async def _discard(self, slot):
+        await browser_supervisor.close_context(slot.context)
+        self._spawn(self._refill())
+
+    async def _healthy(self, slot):
+        # Pages on a crashed or retiring browser are replaced, which lets the old one drain
+        if slot.page.is_closed() or not browser_supervisor.is_current(slot.context):
+            return False
+        try:
+            return await slot.page.locator("#txtchallanNo").count() > 0
+        except Exception:
+            return False
+
+    async def acquire(self):
+        self.start()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + POOL_ACQUIRE_TIMEOUT
+        while True:
+            slot = await asyncio.wait_for(self._ready.get(), max(deadline - loop.time(), 0))
+            if await self._healthy(slot):
+                if loop.time() - slot.loaded_at > self.max_idle:
+                    try:
+                        await self._load(slot)
+                    except Exception:
+                        await self._discard(slot)
+                        continue
+                slot.uses += 1
+                return slot
+            await self._discard(slot)
+
+    def release(self, slot):
+        self._spawn(self._recycle(slot))
+
+    async def _recycle(self, slot):
+        if slot.uses >= self.max_uses or not browser_supervisor.is_current(slot.context):
+            await self._discard(slot)
+            return
+        try:
+            await self._load(slot)
+            self._ready.put_nowait(slot)
+        except Exception as e:
+            print(f"Pool Reload Error: {e}")
+            await self._discard(slot)
+
+page_pool = PagePool()
+
+# --- 6. HTTP Fast Path (ASP.NET postback without a browser) ---
+HTTP_ENGINE = os.getenv("HTTP_ENGINE", "1") == "1"
+FORM_CACHE_TTL = float(os.getenv("FORM_CACHE_TTL", 300))
+HTTP_FALLBACK_COOLDOWN = float(os.getenv("HTTP_FALLBACK_COOLDOWN", 600))
+HTTP_MARKUP_FAILURES = int(os.getenv("HTTP_MARKUP_FAILURES", 3))  # lookups in a row before the engine is switched off
+# The portal's answer for an unknown number: the form again, with this text in #lblMsg
+NOT_FOUND_ELEMENT = os.getenv("NOT_FOUND_ELEMENT", "lblMsg")
+NOT_FOUND_RE = re.compile(os.getenv("NOT_FOUND_PATTERN", r"not\s*found|no\s+record|does\s+not\s+exist"), re.IGNORECASE)
+
+class MarkupChanged(Exception):
+    pass
+
+class PortalRejected(Exception):
+    """The form came back without a PDF and without the not-found message
+    (a validation message, session error or captcha): no verdict on the number."""
+
+class AdmitCardForm:
+    def __init__(self, action, fields, text_name, submit):
+        self.action = action
+        self.fields = fields
+        self.text_name = text_name
+        self.submit = submit
+        self.message = ""  # text of #lblMsg
+        self.fetched_at = 0.0
 
-# --- 3. JNVU Logic ---
+class _FormParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.action = None
+        self.hidden = {}
+        self.by_id = {}
+        self.message = ""
+        self._in_message = None  # tag of the message element while inside it
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {k: v or "" for k, v in attrs}
+        if attrs.get("id") == NOT_FOUND_ELEMENT:
+            self._in_message = tag
+        if tag == "form" and self.action is None:
+            self.action = attrs.get("action", "")
+        if tag == "input" and attrs.get("type", "").lower() == "hidden" and attrs.get("name"):
+            self.hidden[attrs["name"]] = attrs.get("value", "")
+        if attrs.get("id"):
+            self.by_id[attrs["id"]] = (tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag == self._in_message:
+            self._in_message = None
+
+    def handle_data(self, data):
+        if self._in_message:
+            self.message += data
+
+POSTBACK_RE = re.compile(r"__doPostBack\(\s*'([^']*)'\s*,\s*'([^']*)'")
+
+def parse_admit_card_form(html, base_url):
+    parser = _FormParser()
+    parser.feed(html)
+    if "__VIEWSTATE" not in parser.hidden:
+        raise MarkupChanged("__VIEWSTATE missing")
+    box = parser.by_id.get("txtchallanNo")
+    button = parser.by_id.get("btnGetResult")
+    if box is None or button is None or not box[1].get("name"):
+        raise MarkupChanged("#txtchallanNo / #btnGetResult missing")
+
+    tag, attrs = button
+    if tag == "input" and attrs.get("name"):
+        submit = {attrs["name"]: attrs.get("value", "")}
+    else:
+        # LinkButton: the click is a __doPostBack(target, argument) call
+        match = POSTBACK_RE.search(attrs.get("href", "") + attrs.get("onclick", ""))
+        if not match:
+            raise MarkupChanged("cannot work out how #btnGetResult posts back")
+        submit = {"__EVENTTARGET": match.group(1), "__EVENTARGUMENT": match.group(2)}
+
+    action = urljoin(base_url, parser.action or "")
+    form = AdmitCardForm(action, parser.hidden, box[1]["name"], submit)
+    form.message = " ".join(parser.message.split())
+    return form
+
+class AspNetClient:
+    """Replays the admit-card postback over a pooled keep-alive connection.
+
+    The form page (and its __VIEWSTATE / __EVENTVALIDATION) is fetched once per
+    portal session and reused for ``FORM_CACHE_TTL`` seconds. Anything that does not look like the
+    page we know raises MarkupChanged so the caller can use the browser instead.
+    """
+
+    def __init__(self):
+        self._client = None
+        self.disabled_until = 0.0
+        self.markup_failures = 0  # lookups in a row that got a page we could not read
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                follow_redirects=True,
+                timeout=httpx.Timeout(30, connect=10),
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+                headers={"User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"},
+            )
+        return self._client
+
+    def available(self):
+        return HTTP_ENGINE and asyncio.get_running_loop().time() >= self.disabled_until
+
+    def disable(self):
+        self.disabled_until = asyncio.get_running_loop().time() + HTTP_FALLBACK_COOLDOWN
+        self.markup_failures = 0
+
+    def markup_failed(self):
+        # One odd page (ASP.NET's friendly error redirect, say) is not a markup change; several lookups in a row are
+        self.markup_failures += 1
+        if self.markup_failures >= HTTP_MARKUP_FAILURES:
+            self.disable()
+            return True
+        return False
+
+    async def get_form(self, session, refresh=False):
+        form = session.form
+        if not refresh and form is not None and time.monotonic() - form.fetched_at < FORM_CACHE_TTL:
+            return form
+        with timed("http_form"):
+            resp = await self.client.get(session.url)
+        resp.raise_for_status()
+        session.adopt(str(resp.url))
+        session.form = parse_admit_card_form(resp.text, str(resp.url))
+        session.form.fetched_at = time.monotonic()
+        return session.form
+
+    async def download(self, form_number):
+        async with sessions.session() as session:
+            return await self._download(session, form_number)
+
+    async def _download(self, session, form_number):
+        for attempt in range(2):
+            form = await self.get_form(session, refresh=attempt > 0)
+            data = dict(form.fields)
+            data[form.text_name] = str(form_number)
+            data.update(form.submit)
+
+            with timed("http_post"):
+                async with self.client.stream("POST", form.action, data=data) as resp:
+                    resp.raise_for_status()
+                    ctype = resp.headers.get("content-type", "").lower()
+                    disposition = resp.headers.get("content-disposition", "").lower()
+                    if "pdf" in ctype or "attachment" in disposition:
+                        pdf = PdfBuffer()
+                        async for chunk in resp.aiter_bytes():
+                            pdf.write(chunk)
+                        session.last_used = time.monotonic()
+                        self.markup_failures = 0
+                        return pdf
+                    body = (await resp.aread()).decode(resp.encoding or "utf-8", "replace")
+
+            try:
+                answer = parse_admit_card_form(body, str(resp.url))
+            except MarkupChanged:
+                if attempt == 0:
+                    continue  # stale __VIEWSTATE or session, fetch the page again
+                raise
+            session.adopt(str(resp.url))
+            self.markup_failures = 0
+            if NOT_FOUND_RE.search(answer.message):
+                return None  # the portal has no admit card for this number
+            if attempt == 0:
+                continue  # validation or session message: once more on a fresh form
+            raise PortalRejected(f"form came back without a PDF: {answer.message or 'no message'}")
+
+http_engine = AspNetClient()
+
+# --- 7. Upstream Concurrency (AIMD) ---
+# How many downloads may hit the portal at once. The limit grows by one per window of
+# healthy lookups and is cut by AIMD_BACKOFF on a timeout or upstream error, like TCP.
+AIMD_INITIAL_LIMIT = float(os.getenv("AIMD_INITIAL_LIMIT", 4))
+AIMD_MIN_LIMIT = float(os.getenv("AIMD_MIN_LIMIT", 1))
+AIMD_MAX_LIMIT = float(os.getenv("AIMD_MAX_LIMIT", 64))
+AIMD_BACKOFF = float(os.getenv("AIMD_BACKOFF", 0.5))
+AIMD_LATENCY_TOLERANCE = float(os.getenv("AIMD_LATENCY_TOLERANCE", 2.0))  # healthy = under 2x the baseline
+AIMD_HISTORY = int(os.getenv("AIMD_HISTORY", 200))
+
+def is_timeout(e):
+    # Playwright is imported lazily; until it has been, none of its timeouts can happen
+    playwright = sys.modules.get("playwright.async_api")
+    return isinstance(e, (asyncio.TimeoutError, httpx.TimeoutException)) or (
+        playwright is not None and isinstance(e, playwright.TimeoutError)
+    )
+
+def overload_failure(e):
+    if is_timeout(e):
+        return "timeout"
+    if isinstance(e, httpx.TransportError) or (isinstance(e, httpx.HTTPStatusError) and e.response.status_code >= 500):
+        return "error"
+    return None  # our bug or a markup change, says nothing about portal load
+
+class AdaptiveLimiter:
+    """AIMD limit on concurrent upstream downloads.
+
+    Every finished download is a sample: a fast one (under
+    ``AIMD_LATENCY_TOLERANCE`` times the baseline latency) while the limit is
+    in use adds ``1/limit``; a timeout or upstream error multiplies the limit by
+    ``AIMD_BACKOFF``, at most once per batch of requests started before the
+    previous cut. Slow successes leave the limit alone.
+    """
+
+    def __init__(self, initial=AIMD_INITIAL_LIMIT, minimum=AIMD_MIN_LIMIT, maximum=AIMD_MAX_LIMIT):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.waiting = 0
+        self.baseline = None  # slowly rising minimum of observed latency
+        self.last_cut = 0.0
+        self.history = deque(maxlen=AIMD_HISTORY)
+        self._changed = None
+        self._record("start")
+
+    def _record(self, reason):
+        self.history.append({"time": round(time.time(), 3), "limit": round(self.limit, 2), "reason": reason})
+
+    async def _acquire(self):
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        async with self._changed:
+            self.waiting += 1
+            try:
+                await self._changed.wait_for(lambda: self.in_flight < int(self.limit))
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+
+    async def _release(self):
+        async with self._changed:
+            self.in_flight -= 1
+            self._changed.notify_all()
+
+    def _on_success(self, latency, saturated):
+        if self.baseline is None or latency < self.baseline:
+            self.baseline = latency
+        else:
+            self.baseline += (latency - self.baseline) * 0.01
+        if saturated and latency <= self.baseline * AIMD_LATENCY_TOLERANCE and self.limit < self.maximum:
+            before = int(self.limit)
+            self.limit = min(self.limit + 1 / self.limit, self.maximum)
+            if int(self.limit) != before:
+                self._record("increase")
+
+    def _on_failure(self, started, reason):
+        if started < self.last_cut or self.limit <= self.minimum:
+            return  # already cut for this burst
+        self.limit = max(self.limit * AIMD_BACKOFF, self.minimum)
+        self.last_cut = time.monotonic()
+        self._record(reason)
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        with timed("upstream_wait"):
+            await self._acquire()
+        saturated = self.in_flight >= int(self.limit)
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            reason = overload_failure(e)
+            if reason:
+                self._on_failure(started, reason)
+            raise
+        else:
+            self._on_success(time.monotonic() - started, saturated)
+        finally:
+            await self._release()
+
+    def snapshot(self):
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "baseline_latency": self.baseline and round(self.baseline, 3),
+            "history": list(self.history),
+        }
+
+upstream_limiter = AdaptiveLimiter()
+UPSTREAM_LIMIT = Gauge("jnvu_upstream_limit", "Current AIMD limit on concurrent portal downloads", fn=lambda: int(upstream_limiter.limit))
+UPSTREAM_IN_FLIGHT = Gauge("jnvu_upstream_in_flight", "Portal downloads currently running", fn=lambda: upstream_limiter.in_flight)
+UPSTREAM_WAITING = Gauge("jnvu_upstream_waiting", "Downloads waiting for the AIMD limit", fn=lambda: upstream_limiter.waiting)
+
+@app.get("/upstream")
+async def upstream_status():
+    return upstream_limiter.snapshot()
+
+# --- 8. Hedged Downloads ---
+# Each lookup gets DOWNLOAD_DEADLINE seconds in total. An attempt still running after the
+# observed p95 gets a second one alongside it (first answer wins); timeouts and portal
+# errors are retried within the budget. "Not found" is an answer and never retried.
+DOWNLOAD_DEADLINE = float(os.getenv("DOWNLOAD_DEADLINE", 45))
+HEDGE_MAX_ATTEMPTS = int(os.getenv("HEDGE_MAX_ATTEMPTS", 3))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", 5))  # until there are enough samples for a p95
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", 0.5))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", 200))
+RETRY_BACKOFF = float(os.getenv("RETRY_BACKOFF", 0.5))
+
+DOWNLOAD_ATTEMPTS = Counter("jnvu_download_attempts_total", "Upstream download attempts by kind (first, hedge, retry)")
+DOWNLOAD_WINNERS = Counter("jnvu_download_winners_total", "Which kind of attempt answered a lookup")
+
+class LatencyWindow:
+    def __init__(self, size=HEDGE_WINDOW, min_samples=20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, q):
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+download_latency = LatencyWindow()
+
+def hedge_delay():
+    p95 = download_latency.percentile(0.95)
+    return max(HEDGE_MIN_DELAY, HEDGE_DEFAULT_DELAY if p95 is None else p95)
+
+def discard_attempt(task):
+    # A losing attempt may still finish with a PDF nobody will read
+    if not task.cancelled() and task.exception() is None and task.result() is not None:
+        task.result().close()
+
+async def hedged_download(form_number, attempt, deadline=DOWNLOAD_DEADLINE):
+    loop = asyncio.get_running_loop()
+    give_up = loop.time() + deadline
+    running = {}
+    launched = 0
+    last_error = None
+
+    def launch(kind):
+        nonlocal launched
+        launched += 1
+        DOWNLOAD_ATTEMPTS.inc(kind=kind)
+        admitted = asyncio.Event()  # set by the attempt once it holds an AIMD slot
+        running[asyncio.create_task(attempt(form_number, admitted))] = (kind, admitted)
+
+    launch("first")
+    try:
+        while running:
+            remaining = give_up - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"no answer from the portal within {deadline:.0f}s")
+            timeout, can_hedge = remaining, False
+            if len(running) == 1 and launched < HEDGE_MAX_ATTEMPTS:
+                _, admitted = next(iter(running.values()))
+                if not admitted.is_set():
+                    # Still queued for the AIMD limit: the p95 only covers time in a slot, so the
+                    # hedge clock starts once the attempt is admitted
+                    gate = asyncio.ensure_future(admitted.wait())
+                    await asyncio.wait({gate, *running}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                    gate.cancel()
+                    continue
+                timeout, can_hedge = min(remaining, hedge_delay()), True
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # No hedging while others wait for the limit: right after a cut, extra load hurts most
+                if can_hedge and not upstream_limiter.waiting:
+                    launch("hedge")
+                continue
+
+            answers = []
+            for task in done:
+                kind, _ = running.pop(task)
+                try:
+                    answers.append((kind, task.result()))
+                except Exception as e:
+                    if not overload_failure(e):
+                        raise
+                    last_error = e
+            if answers:
+                for _, extra in answers[1:]:
+                    if extra is not None:
+                        extra.close()
+                DOWNLOAD_WINNERS.inc(kind=answers[0][0])
+                return answers[0][1]
+            if not running and launched < HEDGE_MAX_ATTEMPTS:
+                await asyncio.sleep(min(RETRY_BACKOFF, max(give_up - loop.time(), 0)))
+                launch("retry")
+        raise last_error
+    finally:
+        for task in running:
+            task.cancel()
+            task.add_done_callback(discard_attempt)
+
+# --- 9. JNVU Logic ---
 BOT_TOKEN = os.getenv("BOT_TOKEN", "7936101320:AAGTHSCteVyYUzPb-snNWXDn9MxQDZUXs1M")
+PDF_SPOOL_THRESHOLD = int(os.getenv("PDF_SPOOL_THRESHOLD", 5 * 1024 * 1024))
 
-def extract_student_info(pdf_path):
-    info = {"name": "Not Found", "father": "Not Found", "center": "Not Found"}
+class PdfBuffer:
+    """Downloaded PDF kept in memory; spills to a temp file past ``threshold`` bytes."""
+
+    def __init__(self, threshold=PDF_SPOOL_THRESHOLD):
+        self.threshold = threshold
+        self.size = 0
+        self._data = bytearray()
+        self._file = None
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self._file is None and self.size > self.threshold:
+            self._file = tempfile.NamedTemporaryFile(suffix=".pdf")
+            self._file.write(self._data)
+            self._data = bytearray()
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._data += chunk
+
+    def source(self):
+        # What fitz.open takes: the bytes themselves, or the spill file's path
+        if self._file is None:
+            return bytes(self._data)
+        self._file.flush()
+        return self._file.name
+
+    def stream(self):
+        if self._file is None:
+            return io.BytesIO(self._data)
+        self._file.flush()
+        return open(self._file.name, "rb")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._data = bytearray()
+
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", 2))  # 0 = parse in a thread instead
+EXTRACT_BATCH_SIZE = int(os.getenv("EXTRACT_BATCH_SIZE", 16))
+
+# Where each field sits on the admit card. "anchor" is the printed label; "region" is
+# "right" (rest of the label's row, else the next row unless that is another label) or "after"
+# (rest of the row plus the rows below it, up to "max_rows" or the first of "until" anywhere). "pattern" checks the
+# value, "page" pins the field to one page. EXTRACT_TEMPLATE=/path/to.json replaces this list,
+# so new fields are config, not code.
+DEFAULT_EXTRACT_TEMPLATE = [
+    {"field": "name", "anchor": "NAME OF CANDIDATE", "region": "right"},
+    {"field": "father", "anchor": "FATHER'S NAME", "region": "right"},
+    {"field": "center", "anchor": "Exam Centre is", "region": "after", "max_rows": 4,
+     "until": ["Print Date", "To,", "The Centre", "NAME OF EXAMINATION"]},
+    {"field": "roll", "anchor": "Roll no is", "region": "right", "pattern": r"^\d+$"},
+    {"field": "college", "anchor": "COLLEGE NAME", "region": "right"},
+    {"field": "exam", "anchor": "NAME OF EXAMINATION", "region": "right"},
+]
+
+def load_extract_template():
+    path = os.getenv("EXTRACT_TEMPLATE")
+    if not path:
+        return DEFAULT_EXTRACT_TEMPLATE
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+EXTRACT_TEMPLATE = load_extract_template()
+EXTRACT_FIELDS = [spec["field"] for spec in EXTRACT_TEMPLATE]
+# Every anchor in one alternation, so a row is scanned once however many fields there are
+ANCHOR_RE = re.compile("|".join(
+    f"(?P<f{i}>{re.escape(spec['anchor'])})" for i, spec in enumerate(EXTRACT_TEMPLATE)
+), re.IGNORECASE)
+VALUE_PATTERNS = {spec["field"]: re.compile(spec["pattern"]) for spec in EXTRACT_TEMPLATE if spec.get("pattern")}
+LABEL_SEPARATORS = " :-–"
+ROW_GAP = 40  # points of empty space that end a "right" value (next column)
+
+def page_rows(page):
+    """Words of a page grouped into visual rows by their boxes, left to right.
+
+    Grouping by position rather than by PyMuPDF's block/line keeps a label and a
+    value together even when the PDF stores them as separate text blocks.
+    """
+    rows = []
+    for x0, y0, x1, y1, word, *_ in sorted(page.get_text("words"), key=lambda w: (w[1], w[0])):
+        mid = (y0 + y1) / 2
+        if rows and rows[-1]["y0"] <= mid <= rows[-1]["y1"]:
+            rows[-1]["words"].append((x0, x1, word))
+        else:
+            rows.append({"y0": y0, "y1": y1, "words": [(x0, x1, word)]})
+    for row in rows:
+        row["words"].sort()
+        # Character offset of each word in the row text, to map regex matches back to words
+        text, offsets = "", []
+        for x0, x1, word in row["words"]:
+            if text:
+                text += " "
+            offsets.append(len(text))
+            text += word
+        row["text"], row["offsets"] = text, offsets
+    return rows
+
+def words_between(row, start, end):
+    words = [w for w, offset in zip(row["words"], row["offsets"])
+             if start <= offset < end and w[2].strip(LABEL_SEPARATORS)]
+    kept = words[:1]
+    for word in words[1:]:
+        if word[0] - kept[-1][1] > ROW_GAP:
+            break
+        kept.append(word)
+    return " ".join(w[2] for w in kept).strip(LABEL_SEPARATORS)
+
+def cut_at_stop(text, stops):
+    # Text before the first stop label anywhere in it, and whether there was one
+    cut = min((i for i in (text.find(s) for s in stops) if i >= 0), default=-1)
+    return (text, False) if cut < 0 else (text[:cut].strip(LABEL_SEPARATORS), True)
+
+def extract_student_info(pdf):
+    """Fills every template field in one pass over the word rows of the pages it needs.
+
+    Returns the field values ("Not Found" when missing) plus a "confidence" dict:
+    1.0 label and value where the template says, 0.7 value found only on the next
+    row, 0.4 value that does not match the field's pattern, 0.0 missing.
+    """
+    import fitz  # PyMuPDF; imported here so the web process never loads it when EXTRACT_WORKERS > 0
+
+    info = {field: "Not Found" for field in EXTRACT_FIELDS}
+    confidence = {field: 0.0 for field in EXTRACT_FIELDS}
     try:
-        doc = fitz.open(pdf_path)
-        text = "".join([page.get_text() for page in doc])
-        
-        name_match = re.search(r"NAME OF CANDIDATE\s*:\s*(.*)", text)
-        if name_match: info["name"] = name_match.group(1).split('\n')[0].strip()
-
-        father_match = re.search(r"FATHER'S NAME\s*:\s*(.*)", text)
-        if father_match: info["father"] = father_match.group(1).split('\n')[0].strip()
-
-        center_pattern = r"Exam Centre is\s*(.*?)(?=Print Date|To,|The Centre|NAME OF EXAMINATION)"
-        center_match = re.search(center_pattern, text, re.DOTALL)
-        if center_match: info["center"] = " ".join(center_match.group(1).split())
-        
+        doc = fitz.open(stream=pdf, filetype="pdf") if isinstance(pdf, bytes) else fitz.open(pdf)
+        pending = {}  # "after" fields still collecting rows: index -> rows left
+        for page_no, page in enumerate(doc):
+            wanted = [i for i, spec in enumerate(EXTRACT_TEMPLATE)
+                      if confidence[spec["field"]] == 0.0 and spec.get("page", page_no) == page_no]
+            if not wanted:
+                break  # the fields sit on the first page; later pages are not even parsed
+            rows = page_rows(page)
+            for r, row in enumerate(rows):
+                matches = list(ANCHOR_RE.finditer(row["text"]))
+                for i in list(pending):
+                    spec = EXTRACT_TEMPLATE[i]
+                    if matches and matches[0].start() == 0:
+                        del pending[i]
+                        continue
+                    text, stopped = cut_at_stop(row["text"], spec.get("until", ()))
+                    field = spec["field"]
+                    if text:
+                        info[field] = f"{info[field]} {text}" if confidence[field] else text
+                        confidence[field] = confidence[field] or 1.0
+                    pending[i] = pending[i] - 1
+                    if stopped or not pending[i]:
+                        del pending[i]
+                for k, match in enumerate(matches):
+                    i = int(match.lastgroup[1:])
+                    spec = EXTRACT_TEMPLATE[i]
+                    field = spec["field"]
+                    if confidence[field] or i not in wanted:
+                        continue
+                    end = matches[k + 1].start() if k + 1 < len(matches) else len(row["text"])
+                    value, score = words_between(row, match.end(), end), 1.0
+                    if spec.get("region", "right") == "after":
+                        value, stopped = cut_at_stop(value, spec.get("until", ()))
+                        if not stopped:
+                            pending[i] = spec.get("max_rows", 3)
+                        if not value:
+                            continue  # the rows below fill it in
+                    elif not value and r + 1 < len(rows) and not ANCHOR_RE.match(rows[r + 1]["text"]):
+                        value, score = rows[r + 1]["text"], 0.7
+                    if value:
+                        pattern = VALUE_PATTERNS.get(field)
+                        info[field] = value
+                        confidence[field] = score if pattern is None or pattern.search(value) else 0.4
         doc.close()
     except Exception as e:
         print(f"Extraction Error: {e}")
+    info = {field: " ".join(value.split()) for field, value in info.items()}
+    info["confidence"] = confidence
     return info
 
-async def download_jnvu_pdf(form_number):
-    pdf_path = f"admit_card_{form_number}.pdf"
-    try:
-        browser = await get_browser()
-        context = await browser.new_context(accept_downloads=True)
-        page = await context.new_page()
-        
-        url = "https://erp.jnvuiums.in/(S(biolzjtwlrcfmzwwzgs5uj5n))/Exam/Pre_Exam/Exam_ForALL_AdmitCard.aspx#"
-        await page.goto(url, wait_until="load", timeout=60000)
-        await page.fill("#txtchallanNo", str(form_number))
-        
-        async with page.expect_download(timeout=30000) as download_info:
-            await page.click("#btnGetResult")
-        
-        download = await download_info.value
-        await download.save_as(pdf_path)
-        await context.close()
-        return pdf_path
-    except Exception as e:
-        print(f"Download Error: {e}")
-        return None
+def extract_student_info_batch(pdfs):
+    return [extract_student_info(pdf) for pdf in pdfs]
 
-# --- 4. Telegram Handlers ---
-async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_input = update.message.text.strip()
-    if not user_input.isdigit():
-        await update.message.reply_text("❌ कृपया केवल Form Number भेजें।")
-        return
+extract_pool = None
 
-    status_msg = await update.message.reply_text("⚡ एडमिट कार्ड डाउनलोड हो रहा है...")
-    file_path = await download_jnvu_pdf(user_input)
+def warm_extractor():
+    import fitz  # load PyMuPDF before the first admit card needs it
 
-    if file_path and os.path.exists(file_path):
-        data = extract_student_info(file_path)
-        caption = (
-            f"✅ **Admit Card Found!**\n\n"
-            f"👤 **Name:** `{data['name']}`\n"
-            f"👨‍💼 **Father:** `{data['father']}`\n"
-            f"🏫 **Center:**\n`{data['center']}`"
+def get_extract_pool():
+    global extract_pool
+    if extract_pool is None and EXTRACT_WORKERS > 0:
+        # spawn, not fork: this process has the uvicorn thread and Playwright running
+        extract_pool = ProcessPoolExecutor(
+            EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn"), initializer=warm_extractor
         )
-        with open(file_path, 'rb') as doc:
-            await update.message.reply_document(document=doc, caption=caption, parse_mode='Markdown')
-        os.remove(file_path)
-        await status_msg.delete()
-    else:
-        await status_msg.edit_text("❌ एडमिट कार्ड नहीं मिला। कृपया फॉर्म नंबर चेक करें।")
+    return extract_pool
 
-# --- 5. Execution Logic ---
-async def start_bot():
-    # Telegram Application Setup
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
-    application.add_handler(CommandHandler("start", lambda u, c: u.message.reply_text("नमस्ते! Form Number भेजें।")))
-    application.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_message))
-    
-    # Initialize and Start Polling
-    await application.initialize()
-    await application.start()
-    await application.updater.start_polling()
-    
-    print("🚀 Telegram Bot is running...")
-    
-    # Infinite loop to keep the bot alive
-    while True:
-        await asyncio.sleep(3600)
-
-if __name__ == "__main__":
-    # 1. FastAPI को अलग थ्रेड में चलाएं
-    t = threading.Thread(target=run_fastapi, daemon=True)
-    t.start()
-    
-    # 2. Telegram Bot को मेन लूप में चलाएं
-    try:
-        asyncio.run(start_bot())
-    except (KeyboardInterrupt, SystemExit):
-        print("Bot Stopped.")
-            headless=True,
-            args=["--no-sandbox", "--disable-setuid-sandbox", "--disable-dev-shm-usage"]
-        )
-    return browser_instance
+async def warm_extract_pool():
+    # The executor only spawns a worker per submitted task, so send each one a no-op now
+    loop = asyncio.get_running_loop()
+    pool = get_extract_pool()
+    await asyncio.gather(*(loop.run_in_executor(pool, warm_extractor) for _ in range(max(EXTRACT_WORKERS, 1))))
 
-# --- 4. Logic Functions ---
-def extract_student_info(pdf_path):
-    info = {"name": "N/A", "father": "N/A", "center": "N/A"}
+async def run_extract(fn, arg):
+    loop = asyncio.get_running_loop()
+    pool = get_extract_pool()
     try:
-        doc = fitz.open(pdf_path)
-        text = "".join([page.get_text() for page in doc])
-        
-        name_match = re.search(r"NAME OF CANDIDATE\s*:\s*(.*)", text)
-        if name_match: info["name"] = name_match.group(1).split('\n')[0].strip()
+        return await loop.run_in_executor(pool, fn, arg)
+    except BrokenProcessPool:
+        # A parse process died (e.g. OOM-killed) and the executor never recovers; start a new one, once
+        global extract_pool
+        if extract_pool is pool:
+            print("Extract Pool Broken, restarting it")
+            extract_pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+        return await loop.run_in_executor(get_extract_pool(), fn, arg)
 
-        father_match = re.search(r"FATHER'S NAME\s*:\s*(.*)", text)
-        if father_match: info["father"] = father_match.group(1).split('\n')[0].strip()
+async def extract_async(pdf):
+    return await run_extract(extract_student_info, pdf)
 
-        center_pattern = r"Exam Centre is\s*(.*?)(?=Print Date|To,|The Centre|NAME OF EXAMINATION)"
-        center_match = re.search(center_pattern, text, re.DOTALL)
-        if center_match: info["center"] = " ".join(center_match.group(1).split())
+async def extract_many(pdfs):
+    batches = [pdfs[i:i + EXTRACT_BATCH_SIZE] for i in range(0, len(pdfs), EXTRACT_BATCH_SIZE)]
+    results = await asyncio.gather(*(run_extract(extract_student_info_batch, batch) for batch in batches))
+    return [info for batch in results for info in batch]
 
-        doc.close()
-    except Exception as e:
-        print(f"Extraction Error: {e}")
-    return info
+async def download_via_browser(form_number):
+    slot = None
+    try:
+        with timed("page_acquire"):
+            slot = await page_pool.acquire()
+        page = slot.page
+        with timed("submit"):
+            await page.fill("#txtchallanNo", str(form_number))
+            # A valid number answers with a download; an unknown one posts back to the form page
+            # with the not-found message, so "not found" needs no 30s timeout
+            download_info = asyncio.ensure_future(page.wait_for_event("download", timeout=30000))
+            reloaded = asyncio.ensure_future(page.wait_for_event("load", timeout=30000))
+            try:
+                await page.click("#btnGetResult")
+                await asyncio.wait({download_info, reloaded}, return_when=asyncio.FIRST_COMPLETED)
+                if not download_info.done():
+                    reloaded.result()  # re-raises the timeout if nothing happened at all
+                    if await page.locator("#txtchallanNo").count() > 0:
+                        message = page.locator(f"#{NOT_FOUND_ELEMENT}")
+                        if await message.count() > 0 and NOT_FOUND_RE.search(await message.inner_text()):
+                            return None
+                        # Some postbacks re-render the form and then start the download
+                        await asyncio.wait({download_info}, timeout=BROWSER_DOWNLOAD_GRACE)
+                        if not download_info.done():
+                            raise PortalRejected("form came back without a PDF or a not-found message")
+                download = await download_info
+            finally:
+                for waiter in (download_info, reloaded):
+                    waiter.cancel()
+                    waiter.add_done_callback(lambda w: w.cancelled() or w.exception())
+        # Playwright already keeps the download in its own temp dir: read it
+        # from there instead of save_as() into the working directory
+        with timed("download"):
+            pdf = PdfBuffer()
+            with open(await download.path(), "rb") as f:
+                for chunk in iter(lambda: f.read(64 * 1024), b""):
+                    pdf.write(chunk)
+            await download.delete()
+        return pdf
+    finally:
+        if slot is not None:
+            page_pool.release(slot)
 
 async def download_jnvu_pdf(form_number):
-    pdf_path = f"admit_card_{form_number}.pdf"
-    try:
-        browser = await get_browser()
-        context = await browser.new_context(accept_downloads=True)
-        page = await context.new_page()
-        
-        url = "https://erp.jnvuiums.in/(S(biolzjtwlrcfmzwwzgs5uj5n))/Exam/Pre_Exam/Exam_ForALL_AdmitCard.aspx#"
-        await page.goto(url, wait_until="load", timeout=60000)
-        await page.fill("#txtchallanNo", str(form_number))
-        
-        async with page.expect_download(timeout=30000) as download_info:
-            await page.click("#btnGetResult")
-        
-        download = await download_info.value
-        await download.save_as(pdf_path)
-        await context.close()
-        return pdf_path
-    except Exception as e:
-        print(f"Download Error: {e}")
-        return None
+    return await hedged_download(form_number, download_attempt)
 
-# --- 5. Telegram Handlers ---
-async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_input = update.message.text.strip()
-    if not user_input.isdigit():
-        await update.message.reply_text("❌ कृपया केवल Form Number भेजें।")
-        return
+async def download_attempt(form_number, admitted=None):
+    async with upstream_limiter.slot():
+        if admitted is not None:
+            admitted.set()
+        started = time.monotonic()
+        pdf = await download_once(form_number)
+        download_latency.add(time.monotonic() - started)
+        return pdf
 
-    status_msg = await update.message.reply_text("⚡ एडमिट कार्ड डाउनलोड हो रहा है...")
-    file_path = await download_jnvu_pdf(user_input)
+async def download_once(form_number):
+    if http_engine.available():
+        try:
+            return await http_engine.download(form_number)
+        except MarkupChanged as e:
+            if http_engine.markup_failed():
+                print(f"HTTP Engine Disabled, using browser: {e}")
+            else:
+                print(f"HTTP Engine Markup Error, using browser for this lookup: {e}")
+        except PortalRejected:
+            raise  # the portal answered; a browser would get the same page
+        except Exception as e:
+            if overload_failure(e):
+                raise  # the portal itself is slow or failing, a browser would not do better
+            print(f"HTTP Engine Error, using browser: {e}")
+    return await download_via_browser(form_number)
 
-    if file_path and os.path.exists(file_path):
-        data = extract_student_info(file_path)
-        caption = (
-            f"✅ **Admit Card Found!**\n\n"
-            f"👤 **Name:** `{data['name']}`\n"
-            f"👨‍💼 **Father:** `{data['father']}`\n"
-            f"🏫 **Center:**\n`{data['center']}`"
-        )
-        with open(file_path, 'rb') as doc:
-            await update.message.reply_document(document=doc, caption=caption, parse_mode='Markdown')
-        os.remove(file_path)
-        await status_msg.delete()
-    else:
-        await status_msg.edit_text("❌ एडमिट कार्ड नहीं मिला। कृपया Form Number चेक करें।")
+# --- 10. Admit Card Cache ---
+CACHE_DIR = os.getenv("CACHE_DIR", "admit_card_cache")
+CACHE_TTL = float(os.getenv("CACHE_TTL", 6 * 3600))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 5000))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", 500 * 1024 * 1024))
+CACHE_SWEEP_INTERVAL = float(os.getenv("CACHE_SWEEP_INTERVAL", 300))
 
-# --- 6. Main Runner ---
-async def main():
-    # Start FastAPI in a separate thread
-    threading.Thread(target=run_fastapi, daemon=True).start()
+class CacheEntry:
+    def __init__(self, form_number, info, digest, size, file_id=None, stored_at=None):
+        self.form_number = form_number
+        self.info = info
+        self.digest = digest
+        self.size = size
+        self.file_id = file_id
+        self.stored_at = stored_at or time.time()
 
-    # Build and Start Telegram Bot
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
-    application.add_handler(CommandHandler("start", lambda u, c: u.message.reply_text("नमस्ते! अपना Form Number भेजें।")))
-    application.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_message))
-    
-    await application.initialize()
-    await application.start()
-    await application.updater.start_polling()
-    
-    print("🚀 Server and Bot are LIVE!")
-    
-    # Keep the event loop running
-    while True:
-        await asyncio.sleep(3600)
+class AdmitCardCache:
+    """Form number -> extracted fields, PDF and Telegram file_id.
 
-if __name__ == "__main__":
-    try:
-        asyncio.run(main())
-    except KeyboardInterrupt:
-        print("Stopping...")
-            await status_msg.edit_text("❌ एडमिट कार्ड नहीं मिला।")
-
-# --- 3. Unified Runner (FastAPI + Bot) ---
-async def main():
-    # Telegram Bot Setup
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
-    application.add_handler(CommandHandler("start", lambda u,c: u.message.reply_text("नमस्ते! Form Number भेजें।")))
-    application.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_message))
-    
-    await application.initialize()
-    await application.start()
-    await application.updater.start_polling()
-    
-    # FastAPI Server Setup
-    config = uvicorn.Config(app, host="0.0.0.0", port=int(os.environ.get("PORT", 10000)), loop="asyncio")
-    server = uvicorn.Server(config)
-    
-    print("🚀 Server and Bot are starting...")
-    await server.serve()
-
-if __name__ == "__main__":
-    asyncio.run(main())
-    }
-    try:
-        doc = fitz.open(pdf_path)
-        text = "".join([page.get_text() for page in doc])
-        
-        roll_match = re.search(r"Roll no is\s+([\w\d]+)", text)
-        if roll_match: info["roll"] = roll_match.group(1).strip()
+    PDFs live on disk under their sha256 (identical cards are stored once); the
+    index is a SQLite table next to them, so every change is a single-row write
+    and the cache survives restarts. Entries expire after ``ttl`` seconds; the
+    least recently used ones are evicted past ``max_entries`` or ``max_bytes``
+    of PDFs.
 
-        name_match = re.search(r"NAME OF CANDIDATE\s*:\s*(.*)", text)
-        if name_match: info["name"] = name_match.group(1).split('\n')[0].strip()
+    Several processes may share one CACHE_DIR, but only the ``owner`` deletes
+    rows and blobs; the others read and add entries and leave clean-up to it.
+    """
 
-        father_match = re.search(r"FATHER'S NAME\s*:\s*(.*)", text)
-        if father_match: info["father"] = father_match.group(1).split('\n')[0].strip()
+    def __init__(self, root=CACHE_DIR, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        self._conn = None
+        self.owner = True
 
-        college_match = re.search(r"COLLEGE NAME\s*:\s*(.*)", text)
-        if college_match: info["college"] = college_match.group(1).split('\n')[0].strip()
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(
+                os.path.join(self.root, "index.sqlite3"), timeout=30, isolation_level=None, check_same_thread=False
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")  # a lost last write costs one re-download
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (form_number TEXT PRIMARY KEY, info TEXT, digest TEXT,"
+                " size INTEGER, file_id TEXT, stored_at REAL, used_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_used_at ON entries (used_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest)")
+        return self._conn
 
-        center_pattern = r"Exam Centre is\s*(.*?)(?=Print Date|To,|The Centre|NAME OF EXAMINATION)"
-        center_match = re.search(center_pattern, text, re.DOTALL)
-        if center_match: info["center"] = " ".join(center_match.group(1).split())
+    def pdf_path(self, entry):
+        return os.path.join(self.root, "blobs", f"{entry.digest}.pdf")
 
-        doc.close()
-        return info
-    except Exception as e:
-        print(f"Extraction Error: {e}")
-        return info
+    def get(self, form_number):
+        db = self._db()
+        row = db.execute(
+            "SELECT form_number, info, digest, size, file_id, stored_at FROM entries WHERE form_number = ?",
+            (form_number,),
+        ).fetchone()
+        if row is None:
+            return None
+        entry = CacheEntry(row[0], json.loads(row[1]), row[2], row[3], row[4], row[5])
+        if time.time() - entry.stored_at > self.ttl or not (entry.file_id or os.path.exists(self.pdf_path(entry))):
+            if self.owner:
+                self._delete([(form_number, entry.digest)])
+            return None
+        db.execute("UPDATE entries SET used_at = ? WHERE form_number = ?", (time.time(), form_number))
+        return entry
 
-# --- ब्राउज़र मैनेजमेंट ---
-async def get_browser():
-    global browser_instance, playwright_instance
-    if browser_instance is None:
-        playwright_instance = await async_playwright().start()
-        browser_instance = await playwright_instance.chromium.launch(
-            headless=True,
-            args=["--no-sandbox", "--disable-setuid-sandbox", "--disable-dev-shm-usage"]
+    def store_blob(self, pdf):
+        sha = hashlib.sha256()
+        with pdf.stream() as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        blob = os.path.join(self.root, "blobs", f"{digest}.pdf")
+        if not os.path.exists(blob):
+            # Per-process temp name: worker processes may store the same card at once
+            tmp = f"{blob}.{os.getpid()}.tmp"
+            with pdf.stream() as src, open(tmp, "wb") as f:
+                for chunk in iter(lambda: src.read(64 * 1024), b""):
+                    f.write(chunk)
+            os.replace(tmp, blob)
+        return digest
+
+    def put(self, form_number, pdf, info):
+        # The buffer is done with once the blob is written; every reader opens the blob,
+        # which the OS page cache still holds right after this write
+        try:
+            return self.add(form_number, info, self.store_blob(pdf), pdf.size)
+        finally:
+            pdf.close()
+
+    def add(self, form_number, info, digest, size):
+        # For a PDF already in the blob store (e.g. written by a worker process)
+        entry = CacheEntry(form_number, info, digest, size)
+        db = self._db()
+        old = db.execute("SELECT digest FROM entries WHERE form_number = ?", (form_number,)).fetchone()
+        db.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, NULL, ?, ?)",
+            (form_number, json.dumps(info), digest, size, entry.stored_at, entry.stored_at),
         )
-    return browser_instance
+        if self.owner:
+            if old is not None and old[0] != digest:
+                self._remove_unused_blobs([old[0]])
+            self._evict()
+        return entry
 
-# --- डाउनलोड लॉजिक ---
-async def download_jnvu_pdf(form_number):
-    pdf_path = f"admit_card_{form_number}.pdf"
+    def set_file_id(self, entry, file_id):
+        entry.file_id = file_id
+        self._db().execute(
+            "UPDATE entries SET file_id = ? WHERE form_number = ? AND digest = ?", (file_id, entry.form_number, entry.digest)
+        )
+
+    def _delete(self, rows):
+        self._db().executemany("DELETE FROM entries WHERE form_number = ?", [(form,) for form, _ in rows])
+        self._remove_unused_blobs({digest for _, digest in rows})
+
+    def _remove_unused_blobs(self, digests):
+        db = self._db()
+        for digest in digests:
+            if db.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone() is None:
+                try:
+                    os.remove(os.path.join(self.root, "blobs", f"{digest}.pdf"))
+                except OSError:
+                    pass
+
+    def _evict(self):
+        db = self._db()
+        self._delete(db.execute(
+            "SELECT form_number, digest FROM entries WHERE stored_at < ?", (time.time() - self.ttl,)
+        ).fetchall())
+        count, total = db.execute(
+            "SELECT (SELECT COUNT(*) FROM entries), (SELECT COALESCE(SUM(size), 0) FROM"
+            " (SELECT DISTINCT digest, size FROM entries))"
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        victims = []
+        for form_number, digest, size in db.execute("SELECT form_number, digest, size FROM entries ORDER BY used_at"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            victims.append((form_number, digest))
+            count -= 1
+            total -= size  # close enough when several entries share a blob
+        self._delete(victims)
+
+    def sweep(self, min_age=600):
+        # Owner only: evict, then drop blobs no entry points to (e.g. replaced by another process).
+        # min_age spares blobs that were just written and whose entry is not added yet.
+        self._evict()
+        db = self._db()
+        folder = os.path.join(self.root, "blobs")
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            try:
+                if time.time() - os.path.getmtime(path) < min_age:
+                    continue
+                if name.endswith(".tmp") or db.execute(
+                    "SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (name.split(".")[0],)
+                ).fetchone() is None:
+                    os.remove(path)
+            except OSError:
+                pass
+
+admit_card_cache = AdmitCardCache()
+
+# --- 11. Single-flight ---
+class SingleFlight:
+    """Concurrent do() calls with the same key share one in-flight call."""
+
+    def __init__(self):
+        self._calls = {}
+
+    def _forget(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+    async def do(self, key, fn, *args):
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn(*args))
+            self._calls[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+        # A waiter that gets cancelled must not cancel the fetch for everyone else
+        return await asyncio.shield(future)
+
+class KeyedLock:
+    def __init__(self):
+        self._locks = {}
+
+    @contextlib.asynccontextmanager
+    async def hold(self, key):
+        lock, users = self._locks.get(key, (None, 0))
+        lock = lock or asyncio.Lock()
+        self._locks[key] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[key]
+            if users == 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, users - 1)
+
+lookups = SingleFlight()
+upload_locks = KeyedLock()
+
+# --- 12. Job Scheduler ---
+# Jobs are dispatched up to the live AIMD limit (plus SCHEDULER_HEADROOM, so a freed slot is
+# refilled at once); the rest wait here, where they get a queue position and an ETA.
+# MAX_CONCURRENT_JOBS is only a hard ceiling on top of that.
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", AIMD_MAX_LIMIT))
+SCHEDULER_HEADROOM = int(os.getenv("SCHEDULER_HEADROOM", 1))
+PER_CHAT_LIMIT = int(os.getenv("PER_CHAT_LIMIT", 1))
+MAX_QUEUE_DEPTH = int(os.getenv("MAX_QUEUE_DEPTH", 200))
+
+class QueueFull(Exception):
+    pass
+
+class Job:
+    def __init__(self, owner, fn, args, on_position, owner_limit=None):
+        self.owner = owner
+        self.fn = fn
+        self.args = args
+        self.on_position = on_position
+        self.owner_limit = owner_limit  # overrides per_owner, e.g. for bulk jobs
+        self.future = asyncio.get_running_loop().create_future()
+        self.position = None
+        self.enqueued = time.perf_counter()
+        self.context = contextvars.copy_context()  # the submitter's trace follows the job
+
+class JobScheduler:
+    """Runs at most capacity() jobs at once and ``per_owner`` per chat
+    (or the job's own ``owner_limit``).
+
+    Waiting jobs are taken round-robin across chats, so one chat with many
+    requests cannot starve the others. Past ``max_depth`` queued jobs run()
+    raises QueueFull instead of queueing more work.
+    """
+
+    def __init__(self, concurrency=MAX_CONCURRENT_JOBS, per_owner=PER_CHAT_LIMIT, max_depth=MAX_QUEUE_DEPTH):
+        self.concurrency = concurrency
+        self.per_owner = per_owner
+        self.max_depth = max_depth
+        self.queues = OrderedDict()
+        self.running = {}
+        self.active = 0
+        self.depth = 0
+        self.avg_duration = 10.0
+        self._tasks = set()
+
+    async def run(self, owner, fn, *args, on_position=None, owner_limit=None):
+        if self.depth >= self.max_depth:
+            raise QueueFull()
+        job = Job(owner, fn, args, on_position, owner_limit)
+        self.queues.setdefault(owner, deque()).append(job)
+        self.depth += 1
+        self._dispatch()
+        try:
+            return await job.future
+        finally:
+            if not job.future.done():
+                self._remove(job)
+
+    def _remove(self, job):
+        queue = self.queues.get(job.owner)
+        if queue and job in queue:
+            queue.remove(job)
+            self.depth -= 1
+            if not queue:
+                del self.queues[job.owner]
+            self._notify_positions()
+
+    def _next_job(self):
+        for owner, queue in self.queues.items():
+            if self.running.get(owner, 0) < (queue[0].owner_limit or self.per_owner):
+                job = queue.popleft()
+                # Rotate this chat to the back so the next pick goes to someone else
+                del self.queues[owner]
+                if queue:
+                    self.queues[owner] = queue
+                return job
+        return None
+
+    def capacity(self):
+        if job_queue is not None:
+            return self.concurrency  # lookups run in the worker processes, each with its own limiter
+        limit = int(upstream_limiter.limit) + SCHEDULER_HEADROOM
+        if not http_engine.available():
+            limit = min(limit, POOL_SIZE)  # browser lookups would otherwise queue for a page inside the slot
+        return max(min(self.concurrency, limit), 1)
+
+    def _dispatch(self):
+        while self.active < self.capacity():
+            job = self._next_job()
+            if job is None:
+                break
+            self.depth -= 1
+            self.active += 1
+            self.running[job.owner] = self.running.get(job.owner, 0) + 1
+            self._spawn(self._execute(job), job.context)
+            if job.position is not None:
+                self._report(job, 0)
+        self._notify_positions()
+
+    def _spawn(self, coro, context=None):
+        task = asyncio.create_task(coro, context=context)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, job):
+        record_stage("queue_wait", time.perf_counter() - job.enqueued)
+        started = asyncio.get_running_loop().time()
+        try:
+            result = await job.fn(*job.args)
+            if not job.future.done():
+                job.future.set_result(result)
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            self.avg_duration = 0.8 * self.avg_duration + 0.2 * (asyncio.get_running_loop().time() - started)
+            self.active -= 1
+            self.running[job.owner] -= 1
+            if not self.running[job.owner]:
+                del self.running[job.owner]
+            self._dispatch()
+
+    def _waiting_order(self):
+        queues = [list(q) for q in self.queues.values()]
+        order = []
+        for i in range(max(map(len, queues), default=0)):
+            order.extend(q[i] for q in queues if i < len(q))
+        return order
+
+    def eta(self, position):
+        return math.ceil(position / self.capacity()) * self.avg_duration
+
+    def _notify_positions(self):
+        for position, job in enumerate(self._waiting_order(), start=1):
+            if job.on_position is not None and job.position != position:
+                self._report(job, position)
+
+    def _report(self, job, position):
+        job.position = position
+        if job.on_position is not None:
+            self._spawn(self._safe_callback(job.on_position, position, self.eta(position)))
+
+    async def _safe_callback(self, callback, position, eta):
+        try:
+            await callback(position, eta)
+        except Exception as e:
+            print(f"Queue Update Error: {e}")
+
+scheduler = JobScheduler()
+
+# --- 13. Outbound Telegram Queue ---
+# Telegram allows about 30 messages/second per bot, one per second per chat (short bursts
+# are fine) and 20/minute per group. Every send, edit and delete goes through `outbox`,
+# which keeps under those limits instead of running into 429s.
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 25))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", 1))
+TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", 3))
+TELEGRAM_GROUP_RATE = float(os.getenv("TELEGRAM_GROUP_RATE", 20 / 60))
+
+# Lower goes first: answers and documents before new messages, progress edits last
+ANSWER, DOCUMENT, MESSAGE, STATUS = range(4)
+
+TELEGRAM_SENDS = Counter("jnvu_telegram_sends_total", "Outbound Telegram calls by priority and result")
+TELEGRAM_MERGED = Counter("jnvu_telegram_merged_total", "Status edits folded into a newer one before being sent")
+TELEGRAM_QUEUED = Gauge("jnvu_telegram_queued", "Outbound Telegram calls waiting for a rate-limit token", fn=lambda: len(outbox._pending))
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def ready_in(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = max(self.paused_until - now, 0)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def take(self):
+        self.tokens -= 1
+
+class OutboundCall:
+    def __init__(self, chat_id, fn, priority, seq, key=None, future=None):
+        self.chat_id = chat_id
+        self.fn = fn
+        self.priority = priority
+        self.seq = seq
+        self.key = key
+        self.future = future
+        self.queued_at = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class Outbox:
+    """Rate-limited, prioritised queue for outgoing Telegram calls.
+
+    Calls to one chat run one at a time and in priority order; a chat that is
+    out of tokens does not hold up the others. Pending edits of the same message
+    are merged so only the latest text is sent. A 429 pauses that chat for the
+    requested time and the call is retried.
+    """
+
+    def __init__(self):
+        self._pending = []  # sorted by (priority, seq)
+        self._by_key = {}
+        self._chats = {}
+        self._busy = set()
+        self._global = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_RATE)
+        self._seq = 0
+        self._wakeup = None
+        self._runner = None
+
+    def _bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                now = time.monotonic()
+                self._chats = {c: b for c, b in self._chats.items() if b.ready_in(now) or b.tokens < b.burst}
+            # Group and channel ids are negative
+            bucket = TokenBucket(TELEGRAM_GROUP_RATE if chat_id < 0 else TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _enqueue(self, call):
+        bisect.insort(self._pending, call)
+        if call.key is not None:
+            self._by_key[call.key] = call
+        if self._runner is None or self._runner.done():
+            self._wakeup = asyncio.Event()
+            self._runner = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def _new_call(self, chat_id, fn, priority, key=None, future=None):
+        self._seq += 1
+        return OutboundCall(chat_id, fn, priority, self._seq, key, future)
+
+    def post(self, chat_id, fn, priority=STATUS, key=None):
+        # Fire and forget; a pending call with the same key is replaced, keeping its place
+        pending = self._by_key.get(key) if key is not None else None
+        if pending is not None:
+            TELEGRAM_MERGED.inc()
+            pending.fn = fn
+            if priority < pending.priority:
+                self._pending.remove(pending)
+                pending.priority = priority
+                bisect.insort(self._pending, pending)
+            return
+        self._enqueue(self._new_call(chat_id, fn, priority, key))
+
+    async def call(self, chat_id, fn, priority=MESSAGE):
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(self._new_call(chat_id, fn, priority, future=future))
+        return await future
+
+    async def reply(self, message, text, priority=MESSAGE, **kwargs):
+        return await self.call(message.chat_id, lambda: message.reply_text(text, **kwargs), priority)
+
+    async def reply_document(self, message, priority=DOCUMENT, **kwargs):
+        return await self.call(message.chat_id, lambda: message.reply_document(**kwargs), priority)
+
+    def edit(self, message, text, priority=STATUS, **kwargs):
+        self.post(message.chat_id, lambda: message.edit_text(text, **kwargs), priority,
+                  key=("edit", message.chat_id, message.message_id))
+
+    def delete(self, message):
+        stale = self._by_key.pop(("edit", message.chat_id, message.message_id), None)
+        if stale is not None:
+            self._pending.remove(stale)
+        self.post(message.chat_id, message.delete, STATUS, key=("delete", message.chat_id, message.message_id))
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            chosen, wait = None, self._global.ready_in(now) or None
+            if wait is None:
+                for call in self._pending:
+                    if call.chat_id in self._busy:
+                        continue
+                    chat_wait = self._bucket(call.chat_id).ready_in(now)
+                    if not chat_wait:
+                        chosen = call
+                        break
+                    wait = chat_wait if wait is None else min(wait, chat_wait)
+            if chosen is None:
+                self._wakeup.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                continue
+
+            self._pending.remove(chosen)
+            if chosen.key is not None:
+                self._by_key.pop(chosen.key, None)
+            self._global.take()
+            self._bucket(chosen.chat_id).take()
+            self._busy.add(chosen.chat_id)
+            asyncio.create_task(self._send(chosen))
+
+    async def _send(self, call):
+        # Not record_stage: this task runs in whichever context started the queue, not the lookup's
+        STAGE_SECONDS.observe(time.monotonic() - call.queued_at, stage="telegram_queue")
+        try:
+            result = await call.fn()
+        except RetryAfter as e:
+            TELEGRAM_SENDS.inc(priority=call.priority, result="retry_after")
+            self._bucket(call.chat_id).paused_until = time.monotonic() + float(e.retry_after)
+            if call.key is None or call.key not in self._by_key:  # else a newer edit replaced it
+                self._enqueue(call)
+        except Exception as e:
+            TELEGRAM_SENDS.inc(priority=call.priority, result="error")
+            if call.future is not None:
+                if not call.future.done():
+                    call.future.set_exception(e)
+            else:
+                print(f"Telegram Send Error: {e}")
+        else:
+            TELEGRAM_SENDS.inc(priority=call.priority, result="ok")
+            if call.future is not None and not call.future.done():
+                call.future.set_result(result)
+        finally:
+            self._busy.discard(call.chat_id)
+            self._wakeup.set()
+
+outbox = Outbox()
+
+# --- 14. Telegram Handlers ---
+DOWNLOADING_TEXT = "⚡ एडमिट कार्ड डाउनलोड हो रहा है..."
+UPLOADING_TEXT = "📤 PDF भेजी जा रही है..."
+
+def make_caption(data):
+    return (
+        f"✅ **Admit Card Found!**\n\n"
+        f"👤 **Name:** `{data.get('name', 'Not Found')}`\n"
+        f"👨‍💼 **Father:** `{data.get('father', 'Not Found')}`\n"
+        f"🏫 **Center:**\n`{data.get('center', 'Not Found')}`"
+    )
+
+class PortalUnavailable(Exception):
+    """The portal timed out or failed; unlike "not found" this says nothing about the number."""
+
+    def __init__(self, outcome):
+        super().__init__(f"portal lookup failed: {outcome}")
+        self.outcome = outcome  # "timeout" or "error"
+
+async def download_and_parse(form_number):
+    # Returns (outcome, pdf, info); pdf and info are None unless outcome is "success"
     try:
-        browser = await get_browser()  # यह अब async फंक्शन के अंदर है
-        context = await browser.new_context(accept_downloads=True)
-        page = await context.new_page()
-        
-        url = "https://erp.jnvuiums.in/(S(biolzjtwlrcfmzwwzgs5uj5n))/Exam/Pre_Exam/Exam_ForALL_AdmitCard.aspx#"
-        
-        await page.goto(url, wait_until="load", timeout=60000)
-        await page.fill("#txtchallanNo", str(form_number))
-        
-        async with page.expect_download(timeout=30000) as download_info:
-            await page.click("#btnGetResult")
-        
-        download = await download_info.value
-        await download.save_as(pdf_path)
-        await context.close()
-        return pdf_path
+        pdf = await download_jnvu_pdf(form_number)
     except Exception as e:
         print(f"Download Error: {e}")
-        return None
+        return ("timeout" if is_timeout(e) else "error"), None, None
+    if pdf is None or not pdf.size:
+        return "not_found", None, None
+
+    try:
+        with timed("extract"):
+            data = await extract_async(pdf.source())
+    except Exception as e:
+        print(f"Extract Error ({form_number}): {e}")
+        pdf.close()
+        return "error", None, None
+    return "success", pdf, data
+
+async def fetch_admit_card(form_number):
+    if job_queue is not None:
+        outcome, entry = await fetch_via_workers(form_number)
+    else:
+        outcome, pdf, data = await download_and_parse(form_number)
+        entry = admit_card_cache.put(form_number, pdf, data) if pdf is not None else None
+    count_lookup(outcome)
+    if outcome in ("timeout", "error"):
+        raise PortalUnavailable(outcome)
+    if entry is not None:
+        record_parse(entry)
+    return entry
+
+async def lookup_admit_card(form_number, owner, on_position=None, owner_limit=None):
+    entry = admit_card_cache.get(form_number)
+    if entry is not None:
+        count_lookup("cache_hit")
+        return entry
+
+    async def queued_fetch():
+        return await scheduler.run(
+            owner, fetch_admit_card, form_number, on_position=on_position, owner_limit=owner_limit
+        )
+
+    return await lookups.do(form_number, queued_fetch)
+
+def open_pdf(entry):
+    return open(admit_card_cache.pdf_path(entry), 'rb')
+
+async def send_admit_card(message, entry):
+    # Only the first of several waiting chats uploads; the rest reuse its file_id
+    async with upload_locks.hold(entry.form_number):
+        with timed("upload"):
+            if entry.file_id:
+                await outbox.reply_document(message, document=entry.file_id, caption=make_caption(entry.info), parse_mode='Markdown')
+                return
+
+            async def upload():
+                # Opened per attempt: a retry after a 429 has to send the file from the start
+                with open_pdf(entry) as doc:
+                    return await message.reply_document(
+                        document=doc, filename=f"admit_card_{entry.form_number}.pdf",
+                        caption=make_caption(entry.info), parse_mode='Markdown'
+                    )
+
+            sent = await outbox.call(message.chat_id, upload, DOCUMENT)
+        admit_card_cache.set_file_id(entry, sent.document.file_id)
 
-# --- टेलीग्राम मैसेज हैंडलर ---
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_input = update.message.text.strip()
     if not user_input.isdigit():
-        await update.message.reply_text("❌ कृपया केवल Form Number भेजें।")
+        await outbox.reply(update.message, "❌ कृपया केवल Form Number भेजें।")
         return
 
-    status_msg = await update.message.reply_text("⚡ एडमिट कार्ड लोड हो रहा है...")
-    file_path = await download_jnvu_pdf(user_input)
+    trace = start_trace("telegram", user_input)
+    entry = admit_card_cache.get(user_input)
+    status_msg = None
+    if entry is not None:
+        count_lookup("cache_hit")
+    else:
+        status_msg = await outbox.reply(update.message, DOWNLOADING_TEXT)
+
+        async def show_position(position, eta):
+            if position:
+                outbox.edit(status_msg, f"⏳ आप कतार में {position} नंबर पर हैं (लगभग {int(eta)} सेकंड)...")
+            else:
+                outbox.edit(status_msg, DOWNLOADING_TEXT)
 
-    if file_path and os.path.exists(file_path):
-        data = extract_student_info(file_path)
-        caption = (
-            f"✅ **Admit Card Found!**\n\n"
-            f"👤 **Name:** `{data['name']}`\n"
-            f"👨‍💼 **Father:** `{data['father']}`\n"
-            f"🏫 **Center:**\n`{data['center']}`"
-        )
         try:
-            with open(file_path, 'rb') as doc:
-                await update.message.reply_document(document=doc, caption=caption, parse_mode='Markdown')
-            os.remove(file_path)
-            await status_msg.delete()
-        except Exception as e:
-            await status_msg.edit_text(f"❌ त्रुटि: {e}")
+            entry = await lookup_admit_card(user_input, update.effective_chat.id, on_position=show_position)
+        except QueueFull:
+            trace.finish("queue_full")
+            outbox.edit(status_msg, "🚦 अभी बहुत भीड़ है। कृपया थोड़ी देर बाद फिर से कोशिश करें।", ANSWER)
+            return
+        except PortalUnavailable as e:
+            trace.finish(e.outcome)
+            outbox.edit(status_msg, "🐢 यूनिवर्सिटी की वेबसाइट अभी धीमी है। कृपया थोड़ी देर बाद फिर से कोशिश करें।", ANSWER)
+            return
+        if entry is None:
+            trace.finish("not_found")
+            outbox.edit(status_msg, "❌ एडमिट कार्ड नहीं मिला। कृपया फॉर्म नंबर चेक करें।", ANSWER)
+            return
+        if not entry.file_id:
+            # Name and centre go out as soon as they are parsed; the upload follows
+            outbox.edit(status_msg, f"{make_caption(entry.info)}\n\n{UPLOADING_TEXT}", ANSWER, parse_mode='Markdown')
+
+    await send_admit_card(update.message, entry)
+    if status_msg is not None:
+        outbox.delete(status_msg)
+    trace.finish("success")
+
+# --- 15. Bulk Lookups ---
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", 8))
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", 500))
+BULK_PROGRESS_INTERVAL = float(os.getenv("BULK_PROGRESS_INTERVAL", 3))
+BULK_ZIP_PART_BYTES = 45 * 1024 * 1024  # Telegram bots can upload at most 50 MB per file
+
+def parse_form_numbers(text, is_csv=False):
+    if is_csv:
+        # One form number per row: the first all-digit cell
+        rows = csv.reader(io.StringIO(text))
+        numbers = [next((c.strip() for c in row if c.strip().isdigit()), None) for row in rows]
     else:
-        await status_msg.edit_text("❌ एडमिट कार्ड नहीं मिला।")
+        numbers = re.split(r"[\s,;]+", text)
+    return list(dict.fromkeys(n for n in numbers if n and n.isdigit()))
 
-# --- बॉट रनर (New Async Method) ---
-async def run_bot():
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
-    
-    application.add_handler(CommandHandler("start", lambda u, c: u.message.reply_text("नमस्ते! अपना Form Number भेजें।")))
-    application.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_message))
-    
-    await application.initialize()
-    await application.updater.start_polling()
-    await application.start()
-    
-    print("✅ Telegram Bot Started & Polling...")
-    
-    while True:
-        await asyncio.sleep(3600)
-
-if __name__ == "__main__":
-    # FastAPI को अलग थ्रेड में शुरू करें
-    threading.Thread(target=run_fastapi, daemon=True).start()
-    
-    # बॉट को मुख्य लूप में चलाएं
-    loop = asyncio.get_event_loop()
+async def run_bulk(form_numbers, owner):
+    """Yields (form_number, outcome, entry or None) in the order the lookups finish.
+
+    outcome is "found", "not_found", or "timeout"/"error" when the portal did not answer.
+    """
+    semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+
+    async def one(form_number):
+        async with semaphore:
+            while True:
+                try:
+                    entry = await lookup_admit_card(form_number, owner, owner_limit=BULK_CONCURRENCY)
+                    return form_number, ("found" if entry is not None else "not_found"), entry
+                except QueueFull:
+                    # Bulk work is deferred, not rejected, when the queue is full
+                    await asyncio.sleep(5)
+                except PortalUnavailable as e:
+                    return form_number, e.outcome, None
+                except Exception as e:
+                    print(f"Bulk Error ({form_number}): {e}")
+                    return form_number, "error", None
+
+    for task in asyncio.as_completed([one(n) for n in form_numbers]):
+        yield await task
+
+def build_summary_csv(results):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["form_number", "status", *EXTRACT_FIELDS])
+    for form_number, outcome, entry in results:
+        writer.writerow([form_number, outcome, *(entry.info.get(f, "") if entry else "" for f in EXTRACT_FIELDS)])
+    return out.getvalue().encode("utf-8-sig")
+
+def build_zip_parts(results, part_bytes=None, extra_files=()):
+    # PDFs are already compressed, so they are stored as-is; extra files go in the last part
+    parts, buf, zf, size = [], None, None, 0
+    for form_number, _, entry in results:
+        if entry is None:
+            continue
+        if zf is None or (part_bytes and size and size + entry.size > part_bytes):
+            if zf is not None:
+                zf.close()
+                parts.append(buf.getvalue())
+            buf = io.BytesIO()
+            zf = zipfile.ZipFile(buf, "w")
+            size = 0
+        try:
+            with open_pdf(entry) as f:
+                zf.writestr(f"admit_card_{form_number}.pdf", f.read())
+            size += entry.size
+        except OSError as e:
+            print(f"Bulk Zip Error ({form_number}): {e}")
+    if zf is None and extra_files:
+        buf = io.BytesIO()
+        zf = zipfile.ZipFile(buf, "w")
+    if zf is not None:
+        for name, data in extra_files:
+            zf.writestr(name, data, compress_type=zipfile.ZIP_DEFLATED)
+        zf.close()
+        parts.append(buf.getvalue())
+    return parts
+
+async def bulk_for_chat(update, form_numbers):
+    if not form_numbers:
+        await outbox.reply(update.message, "❌ कोई Form Number नहीं मिला। उदाहरण: /bulk 123456 234567 या CSV फ़ाइल भेजें।")
+        return
+    if len(form_numbers) > BULK_MAX_ITEMS:
+        await outbox.reply(update.message, f"❌ एक बार में अधिकतम {BULK_MAX_ITEMS} Form Number भेजें।")
+        return
+
+    total = len(form_numbers)
+    status_msg = await outbox.reply(update.message, f"📦 {total} एडमिट कार्ड डाउनलोड हो रहे हैं...")
+    results, recent = [], deque(maxlen=5)
+    last_edit = 0.0
+    async for form_number, outcome, entry in run_bulk(form_numbers, update.effective_chat.id):
+        results.append((form_number, outcome, entry))
+        if entry:
+            recent.append(f"✅ {form_number} — {entry.info['name']}")
+        else:
+            recent.append(f"❌ {form_number}" if outcome == "not_found" else f"🐢 {form_number} (वेबसाइट धीमी)")
+        now = asyncio.get_running_loop().time()
+        if now - last_edit >= BULK_PROGRESS_INTERVAL and len(results) < total:
+            last_edit = now
+            outbox.edit(status_msg, f"📦 {len(results)}/{total} पूरे\n" + "\n".join(recent))
+
+    found = sum(1 for _, outcome, _ in results if outcome == "found")
+    failed = sum(1 for _, outcome, _ in results if outcome in ("timeout", "error"))
+    text = f"📦 {total} में से {found} एडमिट कार्ड मिले।"
+    if failed:
+        text += f"\n🐢 {failed} के लिए वेबसाइट ने जवाब नहीं दिया; इन्हें थोड़ी देर बाद फिर से भेजें।"
+    outbox.edit(status_msg, text, ANSWER)
+    parts = await asyncio.to_thread(build_zip_parts, results, BULK_ZIP_PART_BYTES)
+    for i, part in enumerate(parts, start=1):
+        name = "admit_cards.zip" if len(parts) == 1 else f"admit_cards_part{i}.zip"
+        await outbox.reply_document(update.message, document=part, filename=name)
+    await outbox.reply_document(update.message, document=build_summary_csv(results), filename="summary.csv")
+
+async def handle_bulk(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await bulk_for_chat(update, parse_form_numbers(" ".join(context.args)))
+
+async def handle_bulk_csv(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    file = await update.message.document.get_file()
+    data = await file.download_as_bytearray()
+    await bulk_for_chat(update, parse_form_numbers(data.decode("utf-8-sig", "replace"), is_csv=True))
+
+class BulkRequest(BaseModel):
+    form_numbers: list[str]
+
+@app.post("/bulk")
+async def bulk_api(request: BulkRequest, format: str = "zip"):
+    form_numbers = parse_form_numbers(" ".join(request.form_numbers))
+    if not form_numbers or len(form_numbers) > BULK_MAX_ITEMS:
+        raise HTTPException(400, f"send 1-{BULK_MAX_ITEMS} numeric form numbers")
+    # Each bulk request is its own owner, so concurrent callers are served round-robin
+    owner = f"api-bulk:{os.urandom(4).hex()}"
+
+    if format == "ndjson":
+        async def stream():
+            async for form_number, outcome, entry in run_bulk(form_numbers, owner):
+                row = {"form_number": form_number, "outcome": outcome, "found": entry is not None,
+                       **(entry.info if entry else {})}
+                yield json.dumps(row, ensure_ascii=False) + "\n"
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    results = [r async for r in run_bulk(form_numbers, owner)]
+    parts = await asyncio.to_thread(build_zip_parts, results, None, [("summary.csv", build_summary_csv(results))])
+    return Response(parts[0], media_type="application/zip",
+                    headers={"Content-Disposition": 'attachment; filename="admit_cards.zip"'})
+
+# --- 16. REST API ---
+API_CACHE_MAX_AGE = int(os.getenv("API_CACHE_MAX_AGE", 3600))
+
+async def api_lookup(form_number, request):
+    if not form_number.isdigit():
+        raise HTTPException(400, "form number must be numeric")
+    trace = start_trace("api", form_number)
+    try:
+        entry = await lookup_admit_card(form_number, f"api:{request.client.host if request.client else '-'}")
+    except QueueFull:
+        trace.finish("queue_full")
+        raise HTTPException(503, "too many lookups in progress, retry shortly", headers={"Retry-After": "30"})
+    except PortalUnavailable as e:
+        # Not a verdict on the number: nobody downstream may cache this
+        trace.finish(e.outcome)
+        if e.outcome == "timeout":
+            raise HTTPException(504, "the university portal did not answer in time", headers={"Cache-Control": "no-store"})
+        raise HTTPException(502, "the university portal returned an error", headers={"Cache-Control": "no-store"})
+    trace.finish("success" if entry is not None else "not_found")
+    if entry is None:
+        raise HTTPException(404, "admit card not found", headers={"Cache-Control": "public, max-age=60"})
+    return entry
+
+def cache_headers(etag):
+    return {"ETag": etag, "Cache-Control": f"public, max-age={API_CACHE_MAX_AGE}"}
+
+def etag_matches(request, etag):
+    tags = [t.strip().removeprefix("W/") for t in request.headers.get("if-none-match", "").split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+# Registered before /admit-card/{form_number}, which would otherwise swallow the ".pdf"
+@app.get("/admit-card/{form_number}.pdf")
+async def admit_card_pdf(form_number: str, request: Request):
+    entry = await api_lookup(form_number, request)
+    headers = cache_headers(f'"{entry.digest}"')
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    f = open_pdf(entry)
+
+    async def body():
+        with f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                yield chunk
+
+    headers["Content-Length"] = str(entry.size)
+    headers["Content-Disposition"] = f'inline; filename="admit_card_{form_number}.pdf"'
+    return StreamingResponse(body(), media_type="application/pdf", headers=headers)
+
+@app.get("/admit-card/{form_number}")
+async def admit_card_json(form_number: str, request: Request):
+    entry = await api_lookup(form_number, request)
+    data = {"form_number": form_number, **entry.info}
+    etag = '"%s"' % hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:32]
+    headers = cache_headers(etag)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(data, headers=headers)
+
+# --- 17. Worker Sharding ---
+# JOB_QUEUE=1: fetches go through a SQLite job table to worker processes (`python main.py worker`),
+# each with its own browser and HTTP client. WORKER_PROCESSES of them are started with the app;
+# more can run elsewhere as long as they share JOB_DB and CACHE_DIR.
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", 0))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", 4))
+JOB_QUEUE = os.getenv("JOB_QUEUE", "1" if WORKER_PROCESSES else "0") == "1"
+JOB_DB = os.getenv("JOB_DB", os.path.join(CACHE_DIR, "jobs.sqlite3"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 0.05))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 180))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", 150))
+
+class JobQueue:
+    """Lookup jobs in a SQLite table shared by the front end and the workers.
+
+    Workers claim a job by leasing it; a job whose worker died is handed out
+    again once its lease runs out. All SQLite calls run on one thread.
+    """
+
+    def __init__(self, path=JOB_DB):
+        self.path = path
+        self._executor = ThreadPoolExecutor(1)
+        self._conn = None
+        self._waiters = {}
+        self._poller = None
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY, form_number TEXT, status TEXT,"
+                " worker TEXT, leased_until REAL, result TEXT)"
+            )
+        return self._conn
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _submit(self, form_number):
+        return self._db().execute("INSERT INTO jobs (form_number, status) VALUES (?, 'queued')", (form_number,)).lastrowid
+
+    def _claim(self, worker):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT id, form_number FROM jobs WHERE status = 'queued'"
+                " OR (status = 'running' AND leased_until < ?) ORDER BY id LIMIT 1", (time.time(),)
+            ).fetchone()
+            if row is not None:
+                db.execute("UPDATE jobs SET status = 'running', worker = ?, leased_until = ? WHERE id = ?",
+                           (worker, time.time() + JOB_LEASE_SECONDS, row[0]))
+            db.execute("COMMIT")
+            return row
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def _complete(self, job_id, result):
+        self._db().execute("UPDATE jobs SET status = 'done', result = ? WHERE id = ?", (json.dumps(result), job_id))
+
+    def _collect(self, job_ids):
+        db = self._db()
+        marks = ",".join("?" * len(job_ids))
+        rows = db.execute(f"SELECT id, result FROM jobs WHERE status = 'done' AND id IN ({marks})", job_ids).fetchall()
+        if rows:
+            db.execute(f"DELETE FROM jobs WHERE id IN ({','.join('?' * len(rows))})", [r[0] for r in rows])
+        return rows
+
+    def _cancel(self, job_id):
+        self._db().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    async def claim(self, worker):
+        return await self._run(self._claim, worker)
+
+    async def complete(self, job_id, result):
+        await self._run(self._complete, job_id, result)
+
+    async def run(self, form_number, timeout=JOB_TIMEOUT):
+        job_id = await self._run(self._submit, form_number)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[job_id] = future
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll())
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            await self._run(self._cancel, job_id)
+            raise
+        finally:
+            self._waiters.pop(job_id, None)
+
+    async def _poll(self):
+        # One poller for every waiting job instead of a query per job
+        while self._waiters:
+            try:
+                for job_id, result in await self._run(self._collect, list(self._waiters)):
+                    future = self._waiters.get(job_id)
+                    if future is not None and not future.done():
+                        future.set_result(json.loads(result))
+            except Exception as e:
+                print(f"Job Queue Error: {e}")
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+job_queue = JobQueue() if JOB_QUEUE else None
+worker_processes = []
+
+async def fetch_via_workers(form_number):
     try:
-        loop.run_until_complete(run_bot())
-    except KeyboardInterrupt:
-        pass
-    pdf_path = f"admit_card_{form_number}.pdf"
-    browser = await get_browser()
-    context = await browser.new_context(accept_downloads=True)
-    page = await context.new_page()
-    url = "https://erp.jnvuiums.in/(S(biolzjtwlrcfmzwwzgs5uj5n))/Exam/Pre_Exam/Exam_ForALL_AdmitCard.aspx#"
-    
+        with timed("worker"):
+            result = await job_queue.run(form_number)
+    except asyncio.TimeoutError:
+        return "timeout", None
+    if result["outcome"] != "success":
+        return result["outcome"], None
+    return "success", admit_card_cache.add(form_number, result["info"], result["digest"], result["size"])
+
+async def process_job(job_id, form_number):
+    # Workers only write the blob; the index (and eviction) stays with the front end, see fetch_via_workers
+    pdf = None
     try:
-        await page.goto(url, wait_until="load", timeout=60000)
-        await page.fill("#txtchallanNo", str(form_number))
-        submit_btn = page.locator("#btnGetResult")
-        
-        async with page.expect_download(timeout=30000) as download_info:
-            await submit_btn.click()
-        
-        download = await download_info.value
-        await download.save_as(pdf_path)
-        await context.close()
-        return pdf_path
+        outcome, pdf, data = await download_and_parse(form_number)
+        result = {"outcome": outcome}
+        if pdf is not None:
+            result.update(info=data, digest=admit_card_cache.store_blob(pdf), size=pdf.size)
     except Exception as e:
-        print(f"Download Error: {e}")
-        await context.close()
-        return None
+        # Answer the job anyway, or the waiting chat sits out the whole JOB_TIMEOUT
+        print(f"Worker Job Error: {e}")
+        result = {"outcome": "error"}
+    finally:
+        if pdf is not None:
+            pdf.close()
+    await job_queue.complete(job_id, result)
 
-# --- टेलीग्राम मैसेज हैंडलर ---
-async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_input = update.message.text.strip()
-    if not user_input.isdigit():
-        await update.message.reply_text("❌ कृपया केवल Form Number भेजें।")
-        return
+async def worker_loop(name):
+    print(f"👷 Worker {name} started")
+    if HTTP_ENGINE:
+        sessions.start()
+    else:
+        page_pool.start()
+    await warm_extract_pool()
+    running = set()
+    while True:
+        if len(running) < WORKER_CONCURRENCY:
+            job = await job_queue.claim(name)
+            if job is not None:
+                task = asyncio.create_task(process_job(*job))
+                running.add(task)
+                task.add_done_callback(running.discard)
+                continue
+        await asyncio.sleep(JOB_POLL_INTERVAL)
 
-    status_msg = await update.message.reply_text("⚡ एडमिट कार्ड लोड हो रहा है...")
-    file_path = await download_jnvu_pdf(user_input)
+def start_worker_processes():
+    env = dict(os.environ, EXTRACT_WORKERS="0", WORKER_PROCESSES="0", JOB_QUEUE="1")
+    for _ in range(WORKER_PROCESSES):
+        worker_processes.append(subprocess.Popen([sys.executable, os.path.abspath(__file__), "worker"], env=env))
 
-    if file_path and os.path.exists(file_path):
-        data = extract_student_info(file_path)
-        caption = (
-            f"✅ **Admit Card Found!**\n\n"
-            f"👤 **Name:** `{data['name']}`\n"
-            f"👨‍💼 **Father:** `{data['father']}`\n"
-            f"🏫 **Center:**\n`{data['center']}`"
-        )
+def stop_worker_processes():
+    for proc in worker_processes:
+        proc.terminate()
+    for proc in worker_processes:
+        proc.wait()
+    worker_processes.clear()
+
+# --- 18. Execution Logic ---
+# webhook: Telegram POSTs updates to /telegram on this app (set WEBHOOK_URL to the public base URL)
+# polling: local development, no public URL needed
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+BOT_MODE = os.getenv("BOT_MODE", "webhook" if WEBHOOK_URL else "polling")
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+# Launch Chromium and load the form at startup; off by default when the HTTP engine does the lookups
+PREWARM_BROWSER = os.getenv("PREWARM_BROWSER", "0" if HTTP_ENGINE else "1") == "1"
+STARTUP_WARM_TIMEOUT = float(os.getenv("STARTUP_WARM_TIMEOUT", 60))
+TELEGRAM_RETRY_MAX = float(os.getenv("TELEGRAM_RETRY_MAX", 60))  # longest wait between Telegram start attempts
+LEADER_RETRY_INTERVAL = float(os.getenv("LEADER_RETRY_INTERVAL", 10))
+
+STARTUP_SECONDS = Gauge("jnvu_startup_seconds", "Seconds from process start until each startup step was done", labelled=True)
+
+application = None
+
+LOADED_AT = time.monotonic()
+
+def process_uptime():
+    # Seconds since this process started, so interpreter and import time count too (Linux /proc)
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(") ", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            return float(f.read().split()[0]) - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return time.monotonic() - LOADED_AT
+
+class Startup:
+    """Warm-up steps that run after uvicorn is already serving.
+
+    /ready answers 503 until every step is done. A warm-up step that fails or
+    runs past STARTUP_WARM_TIMEOUT is logged and no longer waited for (the
+    lookup path will start it on demand); the Telegram step is retried until
+    it succeeds.
+    """
+
+    def __init__(self):
+        self.steps = {}
+        self.task = None
+        self.ready = False
+
+    def start(self, steps):
+        self.steps = {name: {"status": "pending", "seconds": None} for name in steps}
+        self.task = asyncio.create_task(self._run(steps))
+
+    async def _step(self, name, coro):
         try:
-            with open(file_path, 'rb') as doc:
-                await update.message.reply_document(document=doc, caption=caption, parse_mode='Markdown')
-            os.remove(file_path)
-            await status_msg.delete()
+            await asyncio.wait_for(coro, None if name == "telegram" else STARTUP_WARM_TIMEOUT)
+            status = "ok"
+        except asyncio.TimeoutError:
+            status = "timeout"
+            print(f"Startup: {name} not warm after {STARTUP_WARM_TIMEOUT:.0f}s, serving anyway")
         except Exception as e:
-            await status_msg.edit_text(f"❌ त्रुटि: {e}")
-    else:
-        await status_msg.edit_text("❌ एडमिट कार्ड नहीं मिला।")
-
-# --- नया तरीका (Updated run_bot) ---
-async def run_bot():
-    # Application बिल्ड करें
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
-    
-    # हैंडलर्स जोड़ें
-    application.add_handler(CommandHandler("start", lambda u, c: u.message.reply_text("अपना Form Number भेजें।")))
+            status = "failed"
+            print(f"Startup Error ({name}): {e}")
+        seconds = process_uptime()
+        self.steps[name] = {"status": status, "seconds": round(seconds, 3)}
+        STARTUP_SECONDS.set(seconds, step=name)
+
+    async def _run(self, steps):
+        await asyncio.gather(*(self._step(name, coro) for name, coro in steps.items()))
+        if self.steps["telegram"]["status"] != "ok":
+            return
+        self.ready = True
+        seconds = process_uptime()
+        STARTUP_SECONDS.set(seconds, step="ready")
+        print(f"✅ Ready {seconds:.1f}s after process start: " + ", ".join(
+            f"{name} {step['seconds']}s ({step['status']})" for name, step in self.steps.items()
+        ))
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    def snapshot(self):
+        return {"ready": self.ready, "uptime": round(process_uptime(), 1), "steps": self.steps}
+
+startup = Startup()
+
+def build_application():
+    builder = ApplicationBuilder().token(BOT_TOKEN).concurrent_updates(True)
+    if BOT_MODE == "webhook":
+        builder = builder.updater(None)
+    application = builder.build()
+    application.add_handler(CommandHandler("start", lambda u, c: outbox.reply(u.message, "नमस्ते! Form Number भेजें।")))
+    application.add_handler(CommandHandler("bulk", handle_bulk))
+    application.add_handler(MessageHandler(filters.Document.FileExtension("csv"), handle_bulk_csv))
     application.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_message))
-    
-    # नया async तरीका: initialize और updater का इस्तेमाल
-    await application.initialize()
-    await application.updater.start_polling()
-    await application.start()
-    
-    print("✅ Telegram Bot Started & Polling...")
-    
-    # बॉट को चालू रखने के लिए रुकें
-    try:
-        while True:
-            await asyncio.sleep(3600)  # हर एक घंटे बाद लूप चेक करें
-    except (KeyboardInterrupt, SystemExit):
-        await application.stop()
-        await application.updater.stop()
-
-if __name__ == "__main__":
-    # FastAPI को अलग थ्रेड में चलाएं
-    threading.Thread(target=run_fastapi, daemon=True).start()
-    
-    # बॉट को मुख्य लूप में चलाएं
-    loop = asyncio.get_event_loop()
-    try:
-        loop.run_until_complete(run_bot())
-    except KeyboardInterrupt:
-        pass
-    pdf_path = f"admit_card_{form_number}.pdf"
-    browser = await get_browser()
-    context = await browser.new_context(accept_downloads=True)
-    page = await context.new_page()
-    
-    url = "https://erp.jnvuiums.in/(S(biolzjtwlrcfmzwwzgs5uj5n))/Exam/Pre_Exam/Exam_ForALL_AdmitCard.aspx#"
-    
+    return application
+
+@app.post("/telegram")
+async def telegram_webhook(request: Request):
+    if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+        raise HTTPException(403)
+    if application is None or not application.running:
+        raise HTTPException(503)  # still starting; Telegram delivers the update again later
+    update = Update.de_json(await request.json(), application.bot)
+    # Acknowledge right away so Telegram does not hold back the next update
+    application.create_task(application.process_update(update), update=update)
+    return {"ok": True}
+
+async def start_telegram():
+    # Telegram or the network being down at boot must not leave the process up but never ready
+    global application
+    delay = 1
+    while True:
+        application = build_application()
+        try:
+            await application.initialize()
+            await application.start()
+            if BOT_MODE == "polling":
+                await application.updater.start_polling()
+            elif is_leader:
+                await set_webhook()
+            break
+        except Exception as e:
+            print(f"Telegram Start Error: {e}; retrying in {delay}s")
+            await stop_telegram()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, TELEGRAM_RETRY_MAX)
+    print(f"🚀 Telegram Bot is running ({BOT_MODE})...")
+
+async def set_webhook():
+    await application.bot.set_webhook(
+        f"{WEBHOOK_URL}/telegram", secret_token=WEBHOOK_SECRET or None, allowed_updates=Update.ALL_TYPES
+    )
+
+async def stop_telegram():
+    # Also tears down a half-started application, so it must not assume any step got done
     try:
-        await page.goto(url, wait_until="load", timeout=60000)
-        await page.fill("#txtchallanNo", str(form_number))
-        submit_btn = page.locator("#btnGetResult")
-        
-        async with page.expect_download(timeout=30000) as download_info:
-            await submit_btn.click()
-        
-        download = await download_info.value
-        await download.save_as(pdf_path)
-        await context.close()
-        return pdf_path
+        if application.updater is not None and application.updater.running:
+            await application.updater.stop()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
     except Exception as e:
-        print(f"Download Error: {e}")
-        await context.close()
-        return None
+        print(f"Telegram Stop Error: {e}")
 
-# --- टेलीग्राम मैसेज हैंडलर ---
-async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_input = update.message.text.strip()
-    if not user_input.isdigit():
-        await update.message.reply_text("❌ कृपया केवल Form Number भेजें।")
-        return
+# With WEB_CONCURRENCY > 1 every uvicorn worker runs start_bot. One of them, the leader, registers
+# the webhook, spawns the job workers and owns cache clean-up; the others take over if it exits.
+is_leader = False
+leader_lock = None
+leader_task = None
 
-    status_msg = await update.message.reply_text("⚡ एडमिट कार्ड लोड हो रहा है...")
-    file_path = await download_jnvu_pdf(user_input)
+def claim_leadership():
+    # First process to lock CACHE_DIR/leader.lock leads; the OS drops the lock when it exits
+    global leader_lock
+    try:
+        import fcntl
+    except ImportError:
+        return True  # no flock (Windows): only single-process setups there
+    lock = open(os.path.join(CACHE_DIR, "leader.lock"), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock.close()
+        return False
+    leader_lock = lock
+    return True
 
-    if file_path and os.path.exists(file_path):
-        data = extract_student_info(file_path)
-        caption = (
-            f"✅ **Admit Card Found!**\n\n"
-            f"👤 **Name:** `{data['name']}`\n"
-            f"👨‍💼 **Father:** `{data['father']}`\n"
-            f"🏫 **Center:**\n`{data['center']}`"
-        )
+async def lead():
+    if WORKER_PROCESSES:
+        start_worker_processes()
+    while True:
+        try:
+            admit_card_cache.sweep()
+        except Exception as e:
+            print(f"Cache Sweep Error: {e}")
+        await asyncio.sleep(CACHE_SWEEP_INTERVAL)
+
+async def follow():
+    global is_leader
+    while not claim_leadership():
+        await asyncio.sleep(LEADER_RETRY_INTERVAL)
+    print(f"👑 Process {os.getpid()} took over as leader")
+    is_leader = admit_card_cache.owner = True
+    # The old leader may have died before it registered the webhook; setting it again is harmless.
+    # If our own start_telegram is still running, it sees is_leader and registers it itself.
+    delay = 1
+    while BOT_MODE == "webhook" and application is not None and application.running:
         try:
-            with open(file_path, 'rb') as doc:
-                await update.message.reply_document(document=doc, caption=caption, parse_mode='Markdown')
-            os.remove(file_path)
-            await status_msg.delete()
+            await set_webhook()
+            break
         except Exception as e:
-            await status_msg.edit_text(f"❌ त्रुटि: {e}")
+            print(f"Webhook Error: {e}; retrying in {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, TELEGRAM_RETRY_MAX)
+    await lead()
+
+async def start_bot():
+    # Returns straight away so uvicorn starts serving; everything slow is a Startup step
+    global is_leader, leader_task
+    is_leader = claim_leadership()
+    admit_card_cache.owner = is_leader
+    leader_task = asyncio.create_task(lead() if is_leader else follow())
+    steps = {"telegram": start_telegram()}
+    if WORKER_PROCESSES:
+        # Lookups run in the workers; let the scheduler keep all of them busy
+        scheduler.concurrency = max(scheduler.concurrency, WORKER_PROCESSES * WORKER_CONCURRENCY)
     else:
-        await status_msg.edit_text("❌ एडमिट कार्ड नहीं मिला।")
-
-async def run_bot():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
-    app.add_handler(CommandHandler("start", lambda u, c: u.message.reply_text("अपना Form Number भेजें।")))
-    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_message))
-    await app.initialize()
-    await app.start_polling()
-    print("✅ Telegram Bot Started")
-
-if __name__ == "__main__":
-    # FastAPI को अलग थ्रेड में चलाएं
-    threading.Thread(target=run_fastapi, daemon=True).start()
-    
-    # बॉट को मुख्य लूप में चलाएं
-    loop = asyncio.get_event_loop()
-    loop.create_task(run_bot())
-    loop.run_forever()
+        if HTTP_ENGINE:
+            steps["sessions"] = sessions.wait_ready()
+        if PREWARM_BROWSER:
+            # Chromium launch plus the form page, so the first browser lookup skips both
+            steps["browser"] = page_pool.wait_ready()
+    if job_queue is None:
+        steps["extract"] = warm_extract_pool()  # with the job queue, parsing happens in the workers
+    startup.start(steps)
+
+async def stop_bot():
+    startup.cancel()
+    if leader_task is not None:
+        leader_task.cancel()
+    if application is not None:
+        await stop_telegram()
+    await browser_supervisor.close()
+    stop_worker_processes()
+    print("Bot Stopped.")
+
+if __name__ == "__main__" and sys.argv[1:2] == ["worker"]:
+    asyncio.run(worker_loop(f"{socket.gethostname()}:{os.getpid()}"))
+elif __name__ == "__main__":
+    # Render या लोकल के लिए पोर्ट सेटअप
+    port = int(os.environ.get("PORT", 10000))
+    # Several polling processes would fight over getUpdates, so only webhook mode scales out
+    workers = WEB_CONCURRENCY if BOT_MODE == "webhook" else 1
+    uvicorn.run("main:app" if workers > 1 else app, host="0.0.0.0", port=port, workers=workers, log_level="info")